@@ -0,0 +1,238 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Hashable, Iterable
+from heapq import merge
+from operator import itemgetter
+import datetime
+
+EPOCH = datetime.datetime(1970, 1, 1)
+NO_VALUE = -1
+
+
+def datetime_to_seconds(date_time: datetime.datetime) -> int:
+    return (date_time - EPOCH) // datetime.timedelta(seconds=1)
+
+
+def seconds_to_datetime(seconds: int) -> datetime.datetime:
+    return EPOCH + datetime.timedelta(seconds=seconds)
+
+
+class Dictionary:
+    """Dictionary encoding for the repetitive columns (locations, employees, skills)."""
+
+    def __init__(self):
+        self.values: list = []
+        self.codes: dict[Hashable, int] = {}
+
+    def encode(self, value: Hashable | None) -> int:
+        if value is None:
+            return NO_VALUE
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def decode(self, code: int):
+        return None if code == NO_VALUE else self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class ShiftColumns:
+    """
+    Columnar table of shifts.
+
+    `start` is kept sorted, so range queries are a binary search instead of a scan.
+    """
+
+    def __init__(self, employees: Dictionary, locations: Dictionary, skills: Dictionary):
+        self.employees = employees
+        self.locations = locations
+        self.skills = skills
+        self.shift_id = array('q')
+        self.start = array('q')
+        self.end = array('q')
+        self.location = array('l')
+        self.required_skills = array('l')
+        self.employee = array('l')
+
+    def __len__(self):
+        return len(self.shift_id)
+
+    def _encode(self, shift) -> tuple[int, int, int, int, int, int]:
+        employee = shift.employee
+        return (datetime_to_seconds(shift.start), datetime_to_seconds(shift.end), shift.shift_id,
+                self.locations.encode(shift.location), self.skills.encode(tuple(shift.required_skills)),
+                self.employees.encode((employee.name, tuple(employee.skill_set)) if employee is not None else None))
+
+    def _get_row(self, row: int) -> tuple[int, int, int, int, int, int]:
+        return (self.start[row], self.end[row], self.shift_id[row], self.location[row], self.required_skills[row],
+                self.employee[row])
+
+    def _extend(self, rows: Iterable[tuple[int, int, int, int, int, int]]):
+        for start, end, shift_id, location, required_skills, employee in rows:
+            self.start.append(start)
+            self.end.append(end)
+            self.shift_id.append(shift_id)
+            self.location.append(location)
+            self.required_skills.append(required_skills)
+            self.employee.append(employee)
+
+    def append_all(self, shifts: Iterable) -> tuple[int, int]:
+        """
+        Appends the shifts after the stored rows and returns their row range.
+
+        The batch is sorted by start, but `start` only stays sorted overall if no shift of the batch starts
+        before the last stored one; use `merge_all` otherwise.
+        """
+        first_row = len(self)
+        self._extend(sorted(map(self._encode, shifts), key=itemgetter(0)))
+        return first_row, len(self)
+
+    def merge_all(self, shifts: Iterable):
+        """Inserts the shifts at their place by start, even if they start before rows that are already stored."""
+        rows = sorted(map(self._encode, shifts), key=itemgetter(0))
+        if not rows:
+            return
+        first_row = bisect_right(self.start, rows[0][0])
+        # Only the stored rows starting after the earliest new shift are moved, usually none or a few
+        moved_rows = [self._get_row(row) for row in range(first_row, len(self))]
+        for column in (self.start, self.end, self.shift_id, self.location, self.required_skills, self.employee):
+            del column[first_row:]
+        self._extend(merge(moved_rows, rows, key=itemgetter(0)))
+
+    def rows_between(self, start: datetime.datetime, end: datetime.datetime) -> range:
+        """Rows of the shifts starting in [start, end)."""
+        return range(bisect_left(self.start, datetime_to_seconds(start)),
+                     bisect_left(self.start, datetime_to_seconds(end)))
+
+    def row_to_dict(self, row: int) -> dict:
+        employee = self.employees.decode(self.employee[row])
+        return {
+            'shift_id': self.shift_id[row],
+            'start': seconds_to_datetime(self.start[row]),
+            'end': seconds_to_datetime(self.end[row]),
+            'location': self.locations.decode(self.location[row]),
+            'required_skills': list(self.skills.decode(self.required_skills[row])),
+            'employee': {'name': employee[0], 'skill_set': list(employee[1])} if employee is not None else None,
+        }
+
+    def minutes_by_employee(self, rows: range) -> dict[str, int]:
+        out = {}
+        for row in rows:
+            employee = self.employees.decode(self.employee[row])
+            if employee is not None:
+                out[employee[0]] = out.get(employee[0], 0) + (self.end[row] - self.start[row]) // 60
+        return out
+
+
+class AvailabilityColumns:
+    """
+    Append-only columnar table of availabilities, sorted by date.
+
+    Compaction archives every date before its cutoff at once, so each batch starts after the stored rows.
+    """
+
+    def __init__(self, employees: Dictionary, availability_types: Dictionary):
+        self.employees = employees
+        self.availability_types = availability_types
+        self.date = array('l')
+        self.employee = array('l')
+        self.availability_type = array('l')
+
+    def __len__(self):
+        return len(self.date)
+
+    def append_all(self, availabilities: Iterable):
+        for availability in sorted(availabilities, key=lambda availability: availability.date):
+            employee = availability.employee
+            self.date.append(availability.date.toordinal())
+            self.employee.append(self.employees.encode((employee.name, tuple(employee.skill_set))))
+            self.availability_type.append(self.availability_types.encode(availability.availability_type))
+
+    def rows_between(self, start: datetime.date, end: datetime.date) -> range:
+        """Rows of the availabilities dated in [start, end)."""
+        return range(bisect_left(self.date, start.toordinal()), bisect_left(self.date, end.toordinal()))
+
+    def row_to_dict(self, row: int) -> dict:
+        employee = self.employees.decode(self.employee[row])
+        return {
+            'employee': {'name': employee[0], 'skill_set': list(employee[1])},
+            'date': datetime.date.fromordinal(self.date[row]),
+            'availability_type': self.availability_types.decode(self.availability_type[row]),
+        }
+
+
+class PublishDelta:
+    """The shifts one `publish()` call moved out of the draft, stored as a row range of `ScheduleArchive.published`."""
+
+    def __init__(self, publish_id: int, first_published_date: datetime.date, last_published_date: datetime.date,
+                 first_row: int, end_row: int):
+        self.publish_id = publish_id
+        self.first_published_date = first_published_date
+        self.last_published_date = last_published_date
+        self.first_row = first_row
+        self.end_row = end_row
+
+
+class ScheduleArchive:
+    """
+    Compact storage for the part of the schedule the solver no longer needs.
+
+    Fully historic shifts and availabilities are moved here on publish, so the lists of the live
+    `EmployeeSchedule` (and every join the constraints do over them) stay bounded by the planning window.
+    Every publish also records the newly published week as a `PublishDelta`.
+    """
+
+    def __init__(self):
+        employees = Dictionary()
+        locations = Dictionary()
+        skills = Dictionary()
+        self.shifts = ShiftColumns(employees, locations, skills)
+        self.published = ShiftColumns(employees, locations, skills)
+        self.availabilities = AvailabilityColumns(employees, Dictionary())
+        self.deltas: list[PublishDelta] = []
+
+    def record_publish(self, shifts: Iterable, first_published_date: datetime.date,
+                       last_published_date: datetime.date) -> PublishDelta:
+        first_row, end_row = self.published.append_all(shifts)
+        delta = PublishDelta(len(self.deltas) + 1, first_published_date, last_published_date, first_row, end_row)
+        self.deltas.append(delta)
+        return delta
+
+    def compact(self, schedule, cutoff: datetime.datetime):
+        """Moves the shifts ending before `cutoff` and the availabilities dated before it out of `schedule`."""
+        cutoff_date = cutoff.date()
+        historic_shifts = []
+        live_shifts = []
+        for shift in schedule.shift_list:
+            (historic_shifts if shift.end < cutoff else live_shifts).append(shift)
+        historic_availabilities = []
+        live_availabilities = []
+        for availability in schedule.availability_list:
+            (historic_availabilities if availability.date < cutoff_date else live_availabilities).append(availability)
+        # A shift crossing the previous cutoff is only archived now, so it may start before shifts archived earlier
+        self.shifts.merge_all(historic_shifts)
+        self.availabilities.append_all(historic_availabilities)
+        schedule.shift_list = live_shifts
+        schedule.availability_list = live_availabilities
+
+    def deltas_since(self, publish_id: int) -> list[dict]:
+        return [{
+            'publish_id': delta.publish_id,
+            'first_published_date': delta.first_published_date,
+            'last_published_date': delta.last_published_date,
+            'shift_list': [self.published.row_to_dict(row) for row in range(delta.first_row, delta.end_row)],
+        } for delta in self.deltas[publish_id:]]
+
+    def shifts_between(self, start: datetime.datetime, end: datetime.datetime) -> list[dict]:
+        return [self.shifts.row_to_dict(row) for row in self.shifts.rows_between(start, end)]
+
+    def availabilities_between(self, start: datetime.date, end: datetime.date) -> list[dict]:
+        return [self.availabilities.row_to_dict(row) for row in self.availabilities.rows_between(start, end)]
+
+    def minutes_by_employee(self, start: datetime.datetime, end: datetime.datetime) -> dict[str, int]:
+        return self.shifts.minutes_by_employee(self.shifts.rows_between(start, end))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Score calculation speed benchmark.
+
+Solves a generated roster for a fixed time, once with all constraints and once with the fairness
+constraints turned off, and reports how many scores were calculated per second.
+It also reports how many what-if scenarios of one reassignment each `POST /scenarios` scores per second.
+
+    $ python benchmark.py --employees 200 --days 90 --seconds 30 --scenarios 200
+"""
+import argparse
+import time
+from random import Random
+
+import optapy
+from optapy.score import HardSoftScore
+
+from demo_data import DemoDataParameters, generate_schedule
+from domain import ScheduleConstraintConfiguration, ScenarioModel, AssignmentEditModel
+from scenarios import evaluate_scenarios
+from solvers import build_solver_config, get_score_director_factory
+
+WITHOUT_FAIRNESS = {
+    "Fair distribution of minutes": HardSoftScore.ZERO,
+    "Fair distribution of night and weekend minutes": HardSoftScore.ZERO,
+}
+
+
+def benchmark(weights: dict[str, HardSoftScore], parameters: DemoDataParameters, seconds: int) -> dict:
+    solver_config = build_solver_config(ScheduleConstraintConfiguration(weights), spent_limit_seconds=seconds)
+    solver = optapy.solver_factory_create(solver_config).buildSolver()
+    schedule = generate_schedule(parameters)
+    start = time.perf_counter()
+    solution = solver.solve(schedule)
+    elapsed = time.perf_counter() - start
+    score_calculation_count = solver.getScoreCalculationCount()
+    return {
+        'shift_count': len(schedule.shift_list),
+        'score': solution.get_score().toString(),
+        'score_calculation_count': score_calculation_count,
+        'score_calculation_speed': score_calculation_count / elapsed,
+    }
+
+
+def benchmark_scenarios(parameters: DemoDataParameters, scenario_count: int) -> dict:
+    schedule = generate_schedule(parameters)
+    random = Random(parameters.seed)
+    for shift in schedule.shift_list:
+        shift.employee = random.choice(schedule.employee_list)
+    scenarios = [ScenarioModel(name=str(i), assignments=[AssignmentEditModel(
+        shift_id=random.choice(schedule.shift_list).shift_id,
+        employee_name=random.choice(schedule.employee_list).name)]) for i in range(scenario_count)]
+    score_director_factory = get_score_director_factory(ScheduleConstraintConfiguration())
+    # The first call compiles the constraint streams, which is not part of the measurement
+    evaluate_scenarios(score_director_factory, schedule, scenarios[:1])
+    start = time.perf_counter()
+    evaluate_scenarios(score_director_factory, schedule, scenarios)
+    elapsed = time.perf_counter() - start
+    return {
+        'shift_count': len(schedule.shift_list),
+        'scenario_speed': scenario_count / elapsed,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures the score calculation speed of the constraints')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--employees', type=int, default=200)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--wards', type=int, default=40)
+    parser.add_argument('--seconds', type=int, default=30, help='solving time per constraint set')
+    parser.add_argument('--scenarios', type=int, default=200, help='what-if scenarios to score, 0 to skip')
+    args = parser.parse_args()
+    benchmark_parameters = DemoDataParameters(seed=args.seed, employee_count=args.employees, day_count=args.days,
+                                              ward_count=args.wards)
+    for name, benchmark_weights in (('all constraints', {}), ('without fairness', WITHOUT_FAIRNESS)):
+        result = benchmark(benchmark_weights, benchmark_parameters, args.seconds)
+        print(f'{name}: {args.employees} employees x {args.days} days ({result["shift_count"]} shifts), '
+              f'{result["score_calculation_speed"]:.0f} score calculations/s, best score {result["score"]}')
+    if args.scenarios > 0:
+        result = benchmark_scenarios(benchmark_parameters, args.scenarios)
+        print(f'scenarios: {args.employees} employees x {args.days} days ({result["shift_count"]} shifts), '
+              f'{result["scenario_speed"]:.1f} scenarios/s')
@@ -0,0 +1,171 @@
+import os
+import struct
+import threading
+import time
+import datetime
+from pathlib import Path
+
+from archive import datetime_to_seconds, seconds_to_datetime
+from domain import EmployeeSchedule
+
+MAGIC = b'ESCKPT02'
+NO_EMPLOYEE = -1
+
+
+class Checkpoint:
+    score: str | None
+    assignments: dict[int, str | None]
+    # The start and location of every checkpointed shift, to recognize a shift id that now names another shift
+    shift_keys: dict[int, tuple[datetime.datetime, str]]
+
+    def __init__(self, score: str | None, assignments: dict[int, str | None],
+                 shift_keys: dict[int, tuple[datetime.datetime, str]]):
+        self.score = score
+        self.assignments = assignments
+        self.shift_keys = shift_keys
+
+
+def _pack_string(value: str) -> bytes:
+    encoded = value.encode('utf-8')
+    return struct.pack('<I', len(encoded)) + encoded
+
+
+def _unpack_string(data: bytes, offset: int) -> tuple[str, int]:
+    (length,) = struct.unpack_from('<I', data, offset)
+    offset += 4
+    return data[offset:offset + length].decode('utf-8'), offset + length
+
+
+def write_checkpoint(path: Path, schedule: EmployeeSchedule):
+    """
+    Writes the assignments and score of `schedule` to `path`.
+
+    The layout is the magic, the score, tables of employee names and locations and then the shift ids,
+    starts, location indices and employee indices as packed little-endian columns. The file is replaced
+    atomically, so a crash while writing leaves the previous checkpoint intact.
+    """
+    employee_indices = {}
+    location_indices = {}
+    shift_ids = []
+    starts = []
+    locations = []
+    assignments = []
+    for shift in schedule.shift_list:
+        shift_ids.append(shift.shift_id)
+        starts.append(datetime_to_seconds(shift.start))
+        locations.append(location_indices.setdefault(shift.location, len(location_indices)))
+        if shift.employee is None:
+            assignments.append(NO_EMPLOYEE)
+        else:
+            assignments.append(employee_indices.setdefault(shift.employee.name, len(employee_indices)))
+    score = schedule.score.toString() if schedule.score is not None else ''
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_name(path.name + '.tmp')
+    with open(temporary_path, 'wb') as file:
+        file.write(MAGIC)
+        file.write(_pack_string(score))
+        file.write(struct.pack('<I', len(employee_indices)))
+        for name in employee_indices:
+            file.write(_pack_string(name))
+        file.write(struct.pack('<I', len(location_indices)))
+        for location in location_indices:
+            file.write(_pack_string(location))
+        file.write(struct.pack('<I', len(shift_ids)))
+        file.write(struct.pack(f'<{len(shift_ids)}q', *shift_ids))
+        file.write(struct.pack(f'<{len(starts)}q', *starts))
+        file.write(struct.pack(f'<{len(locations)}i', *locations))
+        file.write(struct.pack(f'<{len(assignments)}i', *assignments))
+    os.replace(temporary_path, path)
+
+
+def _unpack_strings(data: bytes, offset: int) -> tuple[list[str], int]:
+    (count,) = struct.unpack_from('<I', data, offset)
+    offset += 4
+    out = []
+    for _ in range(count):
+        value, offset = _unpack_string(data, offset)
+        out.append(value)
+    return out, offset
+
+
+def read_checkpoint(path: Path) -> Checkpoint:
+    data = path.read_bytes()
+    if not data.startswith(MAGIC):
+        raise ValueError(f'The file ({path}) is not a schedule checkpoint of this version')
+    score, offset = _unpack_string(data, len(MAGIC))
+    employee_names, offset = _unpack_strings(data, offset)
+    location_names, offset = _unpack_strings(data, offset)
+    (shift_count,) = struct.unpack_from('<I', data, offset)
+    offset += 4
+    shift_ids = struct.unpack_from(f'<{shift_count}q', data, offset)
+    offset += 8 * shift_count
+    starts = struct.unpack_from(f'<{shift_count}q', data, offset)
+    offset += 8 * shift_count
+    locations = struct.unpack_from(f'<{shift_count}i', data, offset)
+    offset += 4 * shift_count
+    assignments = struct.unpack_from(f'<{shift_count}i', data, offset)
+    return Checkpoint(score or None, {
+        shift_id: employee_names[assignment] if assignment != NO_EMPLOYEE else None
+        for shift_id, assignment in zip(shift_ids, assignments)
+    }, {
+        shift_id: (seconds_to_datetime(start), location_names[location])
+        for shift_id, start, location in zip(shift_ids, starts, locations)
+    })
+
+
+def apply_checkpoint(schedule: EmployeeSchedule, checkpoint: Checkpoint) -> bool:
+    """
+    Restores the checkpointed assignments of the draft shifts into `schedule`.
+
+    Shift ids are reused after a restart and a publish, so a shift is only restored if its start and location
+    still match the checkpointed ones. Published shifts, and shifts or employees the checkpoint doesn't know
+    (anymore), are left untouched. Returns whether every shift of `schedule` is assigned afterwards.
+    """
+    employee_by_name = {employee.name: employee for employee in schedule.employee_list}
+    for shift in schedule.shift_list:
+        if not schedule.schedule_state.is_draft(shift):
+            continue
+        if checkpoint.shift_keys.get(shift.shift_id) == (shift.start, shift.location):
+            employee_name = checkpoint.assignments[shift.shift_id]
+            if employee_name is None:
+                shift.employee = None
+            elif employee_name in employee_by_name:
+                shift.employee = employee_by_name[employee_name]
+    return all(shift.employee is not None for shift in schedule.shift_list)
+
+
+class CheckpointWriter:
+    """
+    Writes the latest submitted solution to disk from a background thread.
+
+    `submit` only stores a reference, so it is cheap enough for the best solution callback.
+    The thread writes at most once per `interval_seconds`; solutions submitted in between replace each other.
+    """
+
+    def __init__(self, path: Path, interval_seconds: float = 10):
+        self.path = path
+        self.interval_seconds = interval_seconds
+        self._latest: EmployeeSchedule | None = None
+        self._lock = threading.Lock()
+        self._submitted = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='checkpoint-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, solution: EmployeeSchedule):
+        with self._lock:
+            self._latest = solution
+        self._submitted.set()
+
+    def _run(self):
+        while True:
+            self._submitted.wait()
+            self._submitted.clear()
+            with self._lock:
+                solution, self._latest = self._latest, None
+            if solution is not None:
+                try:
+                    write_checkpoint(self.path, solution)
+                except Exception as exception:
+                    print(f'an exception occurred writing checkpoint {self.path}: {exception}')
+            time.sleep(self.interval_seconds)
@@ -1,10 +1,13 @@
 from optapy import constraint_provider
 from optapy.score import HardSoftScore
-from optapy.constraint import Joiners, ConstraintFactory, Constraint
+from optapy.constraint import Joiners, ConstraintFactory, Constraint, ConstraintCollectors
 
-from domain import Shift, Availability, AvailabilityType
+from domain import Shift, Availability, AvailabilityType, DEFAULT_CONSTRAINT_WEIGHTS
 from datetime import timedelta, datetime
 
+# Squared minutes are scaled down to squared hours, which keeps the per-employee penalty within an int
+FAIRNESS_SCALE = 60 * 60
+
 
 def get_start_of_availability(availability: Availability):
     return datetime.combine(availability.date, datetime.min.time())
@@ -23,36 +26,47 @@ def get_shift_duration_in_minutes(shift: Shift) -> int:
     return int((shift.end - shift.start).total_seconds() // 60)
 
 
-@constraint_provider
-def employee_scheduling_constraints(constraint_factory: ConstraintFactory):
-    return [
-        required_skill(constraint_factory),
-        no_overlapping_shifts(constraint_factory),
-        at_least_10_hours_between_two_shifts(constraint_factory),
-        one_shift_per_day(constraint_factory),
-        unavailable_employee(constraint_factory),
-        desired_day_for_employee(constraint_factory),
-        undesired_day_for_employee(constraint_factory),
-    ]
+def get_squared_minutes(minutes: int) -> int:
+    return minutes * minutes // FAIRNESS_SCALE
+
+
+def build_constraint_provider(weights: dict[str, HardSoftScore]):
+    """
+    Builds a constraint provider that penalizes or rewards every constraint with its weight in `weights`.
+
+    A weight of zero leaves the constraint out, so it costs nothing to calculate. Every provider compiles its own
+    constraint streams, so callers should reuse them, see `solvers.get_constraint_provider`.
+    """
+    enabled_weights = {constraint_name: weight for constraint_name, weight in weights.items() if not weight.isZero()}
 
-def required_skill(constraint_factory: ConstraintFactory) -> Constraint:
+    @constraint_provider
+    def employee_scheduling_constraints(constraint_factory: ConstraintFactory):
+        return [CONSTRAINTS[constraint_name](constraint_factory, weight)
+                for constraint_name, weight in enabled_weights.items()]
+
+    return employee_scheduling_constraints
+
+def required_skill(constraint_factory: ConstraintFactory,
+                   weight: HardSoftScore = HardSoftScore.ONE_HARD) -> Constraint:
     return constraint_factory \
         .for_each(Shift) \
         .filter(lambda shift: any([skill not in shift.employee.skill_set for skill in shift.required_skills])) \
-        .penalize("Missing required skill", HardSoftScore.ONE_HARD)
+        .penalize("Missing required skill", weight)
 
 
-def no_overlapping_shifts(constraint_factory: ConstraintFactory) -> Constraint:
+def no_overlapping_shifts(constraint_factory: ConstraintFactory,
+                          weight: HardSoftScore = HardSoftScore.ONE_HARD) -> Constraint:
     return constraint_factory \
         .for_each_unique_pair(Shift,
                               Joiners.equal(lambda shift: shift.employee),
                               Joiners.overlapping(lambda shift: shift.start,
                                                   lambda shift: shift.end)
                               ) \
-        .penalize("Overlapping shift", HardSoftScore.ONE_HARD, get_minute_overlap)
+        .penalize("Overlapping shift", weight, get_minute_overlap)
 
 
-def at_least_10_hours_between_two_shifts(constraint_factory: ConstraintFactory) -> Constraint:
+def at_least_10_hours_between_two_shifts(constraint_factory: ConstraintFactory,
+                                         weight: HardSoftScore = HardSoftScore.ONE_HARD) -> Constraint:
     ten_hours_in_seconds = 60 * 60 * 10
     return constraint_factory \
         .for_each_unique_pair(Shift,
@@ -62,21 +76,23 @@ def at_least_10_hours_between_two_shifts(constraint_factory: ConstraintFactory)
                               ) \
         .filter(lambda first_shift, second_shift:
                 (second_shift.start - first_shift.end).total_seconds() < ten_hours_in_seconds) \
-        .penalize("At least 10 hours between 2 shifts", HardSoftScore.ONE_HARD,
+        .penalize("At least 10 hours between 2 shifts", weight,
                   lambda first_shift, second_shift:
                   (ten_hours_in_seconds - (second_shift.start - first_shift.end).total_seconds()) // 60)
 
 
-def one_shift_per_day(constraint_factory: ConstraintFactory) -> Constraint:
+def one_shift_per_day(constraint_factory: ConstraintFactory,
+                      weight: HardSoftScore = HardSoftScore.ONE_HARD) -> Constraint:
     return constraint_factory \
         .for_each_unique_pair(Shift,
                               Joiners.equal(lambda shift: shift.employee),
                               Joiners.equal(lambda shift: shift.start.date())
                               ) \
-        .penalize("Max one shift per day", HardSoftScore.ONE_HARD)
+        .penalize("Max one shift per day", weight)
 
 
-def unavailable_employee(constraint_factory: ConstraintFactory) -> Constraint:
+def unavailable_employee(constraint_factory: ConstraintFactory,
+                         weight: HardSoftScore = HardSoftScore.ONE_HARD) -> Constraint:
     return constraint_factory \
         .for_each(Shift) \
         .join(Availability,
@@ -86,11 +102,12 @@ def unavailable_employee(constraint_factory: ConstraintFactory) -> Constraint:
                             lambda availability: availability.date)
               ) \
         .filter(lambda shift, availability: availability.availability_type == AvailabilityType.UNAVAILABLE) \
-        .penalize('Unavailable employee', HardSoftScore.ONE_HARD,
+        .penalize('Unavailable employee', weight,
                   lambda shift, availability: get_shift_duration_in_minutes(shift))
 
 
-def desired_day_for_employee(constraint_factory: ConstraintFactory) -> Constraint:
+def desired_day_for_employee(constraint_factory: ConstraintFactory,
+                             weight: HardSoftScore = HardSoftScore.ONE_SOFT) -> Constraint:
     return constraint_factory \
         .for_each(Shift) \
         .join(Availability,
@@ -100,11 +117,12 @@ def desired_day_for_employee(constraint_factory: ConstraintFactory) -> Constrain
                             lambda availability: availability.date)
               ) \
         .filter(lambda shift, availability: availability.availability_type == AvailabilityType.DESIRED) \
-        .reward('Desired day for employee', HardSoftScore.ONE_SOFT,
+        .reward('Desired day for employee', weight,
                 lambda shift, availability: get_shift_duration_in_minutes(shift))
 
 
-def undesired_day_for_employee(constraint_factory: ConstraintFactory) -> Constraint:
+def undesired_day_for_employee(constraint_factory: ConstraintFactory,
+                               weight: HardSoftScore = HardSoftScore.ONE_SOFT) -> Constraint:
     return constraint_factory \
         .for_each(Shift) \
         .join(Availability,
@@ -114,9 +132,32 @@ def undesired_day_for_employee(constraint_factory: ConstraintFactory) -> Constra
                             lambda availability: availability.date)
               ) \
         .filter(lambda shift, availability: availability.availability_type == AvailabilityType.UNDESIRED) \
-        .penalize('Undesired day for employee', HardSoftScore.ONE_SOFT,
+        .penalize('Undesired day for employee', weight,
                   lambda shift, availability: get_shift_duration_in_minutes(shift))
 
+def fair_distribution_of_minutes(constraint_factory: ConstraintFactory,
+                                 weight: HardSoftScore = HardSoftScore.ONE_SOFT) -> Constraint:
+    # The total number of minutes is fixed, so the sum of squares of the per-employee totals is the smallest when
+    # they are equal. The group_by updates one employee's total per move instead of comparing every pair.
+    # Publishing moves all but the last day of history to the archive (see `main.LIVE_HISTORY`), so the totals
+    # only cover the shifts still in the solution, not the archived ones.
+    return constraint_factory \
+        .for_each(Shift) \
+        .group_by(lambda shift: shift.employee, ConstraintCollectors.sum(get_shift_duration_in_minutes)) \
+        .penalize("Fair distribution of minutes", weight,
+                  lambda employee, minutes: get_squared_minutes(minutes))
+
+
+def fair_distribution_of_unsocial_minutes(constraint_factory: ConstraintFactory,
+                                          weight: HardSoftScore = HardSoftScore.ONE_SOFT) -> Constraint:
+    # Shifts without unsocial minutes add nothing to the sum, so they aren't filtered out first. The minutes are
+    # precomputed per shift, see `Shift.unsocial_minutes`. Like above, the totals only cover the live window.
+    return constraint_factory \
+        .for_each(Shift) \
+        .group_by(lambda shift: shift.employee, ConstraintCollectors.sum(lambda shift: shift.unsocial_minutes)) \
+        .penalize("Fair distribution of night and weekend minutes", weight,
+                  lambda employee, minutes: get_squared_minutes(minutes))
+
 # TODO
 # https://www.optaplanner.org/blog/2021/10/05/ANewAIConstraintSolverForPythonOptaPy.html
 # Jeder Employee soll (desired) max. 40h * 4,25 Wochen
@@ -136,7 +177,8 @@ def undesired_day_for_employee(constraint_factory: ConstraintFactory) -> Constra
 # Manchmal: Nachtdienst
 # Mo-Do, Fr-So
 
-def sequential_shifts_at_same_location(constraint_factory: ConstraintFactory) -> Constraint:
+def sequential_shifts_at_same_location(constraint_factory: ConstraintFactory,
+                                       weight: HardSoftScore = HardSoftScore.ONE_SOFT) -> Constraint:
     return constraint_factory \
         .for_each_unique_pair(Shift,
                               Joiners.equal(lambda shift: shift.employee),
@@ -144,9 +186,10 @@ def sequential_shifts_at_same_location(constraint_factory: ConstraintFactory) ->
                               Joiners.equal(lambda shift: shift.start.date() + timedelta(days=1),
                                             lambda shift: shift.start.date())
                               ) \
-        .reward("Sequential shifts at the same location", HardSoftScore.ONE_SOFT)
+        .reward("Sequential shifts at the same location", weight)
 
-def sequential_shifts_at_same_slot(constraint_factory: ConstraintFactory) -> Constraint:
+def sequential_shifts_at_same_slot(constraint_factory: ConstraintFactory,
+                                   weight: HardSoftScore = HardSoftScore.ONE_SOFT) -> Constraint:
     return constraint_factory \
         .for_each_unique_pair(Shift,
                               Joiners.equal(lambda shift: shift.employee),
@@ -154,4 +197,21 @@ def sequential_shifts_at_same_slot(constraint_factory: ConstraintFactory) -> Con
                               Joiners.equal(lambda shift: shift.start.date() + timedelta(days=1),
                                             lambda shift: shift.start.date())
                               ) \
-        .reward("Sequential shifts at the same slot", HardSoftScore.ONE_SOFT)
+        .reward("Sequential shifts at the same slot", weight)
+
+
+CONSTRAINTS = {
+    "Missing required skill": required_skill,
+    "Overlapping shift": no_overlapping_shifts,
+    "At least 10 hours between 2 shifts": at_least_10_hours_between_two_shifts,
+    "Max one shift per day": one_shift_per_day,
+    "Unavailable employee": unavailable_employee,
+    "Desired day for employee": desired_day_for_employee,
+    "Undesired day for employee": undesired_day_for_employee,
+    "Fair distribution of minutes": fair_distribution_of_minutes,
+    "Fair distribution of night and weekend minutes": fair_distribution_of_unsocial_minutes,
+    "Sequential shifts at the same location": sequential_shifts_at_same_location,
+    "Sequential shifts at the same slot": sequential_shifts_at_same_slot,
+}
+
+employee_scheduling_constraints = build_constraint_provider(DEFAULT_CONSTRAINT_WEIGHTS)
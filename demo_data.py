@@ -0,0 +1,269 @@
+import csv
+import datetime
+import math
+from collections.abc import Iterator
+from itertools import count
+from pathlib import Path
+from random import Random
+
+from pydantic import BaseModel
+
+from domain import Employee, Shift, Availability, AvailabilityType, ScheduleState, EmployeeSchedule
+from templates import ShiftTemplateSet, compile_templates
+
+
+def next_weekday(d, weekday):
+    days_ahead = weekday - d.weekday()
+    if days_ahead <= 0:  # Target day already happened this week
+        days_ahead += 7
+    return d + datetime.timedelta(days_ahead)
+
+
+FIRST_NAMES = ["Amy", "Beth", "Chad", "Dan", "Elsa", "Flo", "Gus", "Hugo", "Ivy", "Jay", "Kate", "Lisa", "Mary", "Nina",
+               "Olivia", "Pat"]
+LAST_NAMES = ["Cole", "Fox", "Green", "Jones", "King", "Li", "Poe", "Rye", "Smith", "Watt", "Xavier", "Yang", "Zhang", "Müller", "Schmidt", "Schneider"]
+
+LOCATION_SHIFT_EMPLOYEE_COUNT = {
+    "Notaufnahme": 1,
+    "Normalstation": 5,
+    "Intensivstation": 1,
+    "Visitendienst": 1,
+}
+
+REQUIRED_SKILLS = list(LOCATION_SHIFT_EMPLOYEE_COUNT.keys())
+OPTIONAL_SKILLS = []
+EMPLOYEE_COUNT = 16
+
+SHIFT = {
+    "Notaufnahme": [
+        [
+            (datetime.time(hour=8), datetime.timedelta(hours=8, minutes=45)),
+            (datetime.time(hour=12), datetime.timedelta(hours=9)),
+            (datetime.time(hour=19, minute=45), datetime.timedelta(hours=12, minutes=45)),
+        ],
+        [
+            (datetime.time(hour=8), datetime.timedelta(hours=8, minutes=45)),
+            (datetime.time(hour=12), datetime.timedelta(hours=9)),
+            (datetime.time(hour=19, minute=45), datetime.timedelta(hours=12, minutes=45)),
+        ],
+        [
+            (datetime.time(hour=8), datetime.timedelta(hours=8, minutes=45)),
+            (datetime.time(hour=12), datetime.timedelta(hours=9)),
+            (datetime.time(hour=19, minute=45), datetime.timedelta(hours=12, minutes=45)),
+        ],
+        [
+            (datetime.time(hour=8), datetime.timedelta(hours=8, minutes=45)),
+            (datetime.time(hour=12), datetime.timedelta(hours=9)),
+            (datetime.time(hour=19, minute=45), datetime.timedelta(hours=12, minutes=45)),
+        ],
+        [
+            (datetime.time(hour=8), datetime.timedelta(hours=12, minutes=30)),
+            (datetime.time(hour=20), datetime.timedelta(hours=12, minutes=30)),
+        ],
+        [
+            (datetime.time(hour=8), datetime.timedelta(hours=12, minutes=30)),
+            (datetime.time(hour=20), datetime.timedelta(hours=12, minutes=30)),
+        ],
+        [
+            (datetime.time(hour=8), datetime.timedelta(hours=12, minutes=30)),
+            (datetime.time(hour=20), datetime.timedelta(hours=12, minutes=30)),
+        ]
+    ],
+    "Normalstation": [
+        [
+            (datetime.time(hour=8), datetime.timedelta(hours=8, minutes=30)),
+        ],
+        [
+            (datetime.time(hour=8), datetime.timedelta(hours=8, minutes=30)),
+        ],
+        [
+            (datetime.time(hour=8), datetime.timedelta(hours=8, minutes=30)),
+        ],
+        [
+            (datetime.time(hour=8), datetime.timedelta(hours=8, minutes=30)),
+        ],
+        [
+            (datetime.time(hour=8), datetime.timedelta(hours=8, minutes=30)),
+        ],
+        [],
+        []
+    ],
+    "Visitendienst": [
+        [],
+        [],
+        [],
+        [],
+        [],
+        [
+            (datetime.time(hour=10), datetime.timedelta(hours=6)),
+        ],
+        [
+            (datetime.time(hour=10), datetime.timedelta(hours=6)),
+        ]
+    ],
+    "Intensivstation": [
+        [
+            (datetime.time(hour=7, minute=30), datetime.timedelta(hours=12, minutes=45)),
+        ],
+        [
+            (datetime.time(hour=7, minute=30), datetime.timedelta(hours=9)),
+        ],
+        [
+            (datetime.time(hour=19, minute=30), datetime.timedelta(hours=12, minutes=45)),
+        ]
+    ]
+}
+
+SHIFT_TEMPLATES = compile_templates(SHIFT, LOCATION_SHIFT_EMPLOYEE_COUNT)
+
+
+class DemoDataParameters(BaseModel):
+    seed: int = 0
+    employee_count: int = EMPLOYEE_COUNT
+    day_count: int = 14
+    ward_count: int = len(SHIFT)
+    # The fraction of the employees that have an availability on any given day
+    availability_density: float = 0.1
+    start_date: datetime.date | None = None
+    holidays: list[datetime.date] = []
+
+    def get_start_date(self) -> datetime.date:
+        return self.start_date if self.start_date is not None else next_weekday(datetime.date.today(), 0)
+
+
+def iter_employee_names(random: Random) -> Iterator[str]:
+    """
+    Lazily produces unique employee names, numbering them once all combinations are used up.
+
+    The combinations are visited in a seeded affine permutation (`multiplier * i + offset` modulo their count),
+    so consecutive names differ in both the first and the last name without building the list of all names.
+    """
+    first_name_count = len(FIRST_NAMES)
+    combination_count = first_name_count * len(LAST_NAMES)
+    while True:
+        multiplier = random.randrange(1, combination_count)
+        # Coprime to the count, the permutation visits every combination once; the other two conditions make the
+        # first and the last name both cycle through all their values
+        if math.gcd(multiplier, combination_count) == 1 \
+                and math.gcd(multiplier % first_name_count, first_name_count) == 1 \
+                and math.gcd(multiplier // first_name_count, len(LAST_NAMES)) == 1:
+            break
+    offset = random.randrange(combination_count)
+    for round_number in count(1):
+        for i in range(combination_count):
+            index = (multiplier * i + offset) % combination_count
+            name = f'{FIRST_NAMES[index % first_name_count]} {LAST_NAMES[index // first_name_count]}'
+            yield name if round_number == 1 else f'{name} {round_number}'
+
+
+def get_shift_templates(ward_count: int, holidays: list[datetime.date]) -> ShiftTemplateSet:
+    """Returns the templates of `ward_count` wards, repeating the demo wards for larger hospitals."""
+    wards = []
+    for i in range(ward_count):
+        ward = SHIFT_TEMPLATES.wards[i % len(SHIFT_TEMPLATES.wards)]
+        repetition = i // len(SHIFT_TEMPLATES.wards)
+        wards.append(ward if repetition == 0 else ward.with_location(f'{ward.location} {repetition + 1}'))
+    return ShiftTemplateSet(wards, holidays)
+
+
+def iter_employee_rows(parameters: DemoDataParameters,
+                       shift_templates: ShiftTemplateSet | None = None) -> Iterator[tuple[str, list[str]]]:
+    random = Random(f'{parameters.seed}-employees')
+    shift_templates = shift_templates or get_shift_templates(parameters.ward_count, parameters.holidays)
+    skills = [ward.skill for ward in shift_templates.wards]
+    required_skills = random.choices(skills, k=parameters.employee_count)
+    for name, required_skill in zip(iter_employee_names(Random(f'{parameters.seed}-names')), required_skills):
+        yield name, [required_skill]
+
+
+def iter_shift_rows(parameters: DemoDataParameters, shift_templates: ShiftTemplateSet | None = None) \
+        -> Iterator[tuple[int, datetime.datetime, datetime.datetime, str, str]]:
+    """Yields (shift_id, start, end, location, required skill) for every shift, day by day."""
+    random = Random(f'{parameters.seed}-shifts')
+    shift_templates = shift_templates or get_shift_templates(parameters.ward_count, parameters.holidays)
+    shift_id = 0
+    for start, end, location, skill, headcount in shift_templates.expand(parameters.get_start_date(),
+                                                                          parameters.day_count, random):
+        for _ in range(headcount):
+            yield shift_id, start, end, location, skill
+            shift_id += 1
+
+
+def iter_availability_rows(parameters: DemoDataParameters) -> Iterator[tuple[int, datetime.date, AvailabilityType]]:
+    """Yields (employee index, date, availability type) for every availability, day by day."""
+    random = Random(f'{parameters.seed}-availabilities')
+    availabilities_per_day = min(parameters.employee_count,
+                                 round(parameters.employee_count * parameters.availability_density))
+    availability_types = list(AvailabilityType)
+    start_date = parameters.get_start_date()
+    employee_indices = range(parameters.employee_count)
+    for day in range(parameters.day_count):
+        date = start_date + datetime.timedelta(days=day)
+        employees = random.sample(employee_indices, availabilities_per_day)
+        for employee, availability_type in zip(employees,
+                                               random.choices(availability_types, k=availabilities_per_day)):
+            yield employee, date, availability_type
+
+
+def generate_schedule(parameters: DemoDataParameters,
+                      shift_templates: ShiftTemplateSet | None = None) -> EmployeeSchedule:
+    """
+    Generates a roster with shift ids counting up from 0.
+
+    The shifts follow `shift_templates` if given, which then replace `ward_count` and `holidays` of `parameters`.
+    """
+    start_date = parameters.get_start_date()
+    employee_list = [Employee(name=name, skill_set=skill_set)
+                     for name, skill_set in iter_employee_rows(parameters, shift_templates)]
+    shift_list = [Shift(shift_id=shift_id, start=start, end=end, location=location, required_skills=[skill],
+                        employee=None)
+                  for shift_id, start, end, location, skill in iter_shift_rows(parameters, shift_templates)]
+    availability_list = [Availability(employee=employee_list[employee], date=date, availability_type=availability_type)
+                         for employee, date, availability_type in iter_availability_rows(parameters)]
+    return EmployeeSchedule(
+        schedule_state=ScheduleState(publish_length=7, draft_length=parameters.day_count, first_draft_date=start_date,
+                                     last_historic_date=start_date),
+        availability_list=availability_list,
+        employee_list=employee_list,
+        shift_list=shift_list,
+        solver_status=None,
+        score=None,
+    )
+
+
+def write_dataset(parameters: DemoDataParameters, directory: Path):
+    """Streams the dataset into employees.csv, shifts.csv and availabilities.csv without building the domain objects."""
+    directory.mkdir(parents=True, exist_ok=True)
+    employee_names = []
+    with open(directory / 'employees.csv', 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(('name', 'skill_set'))
+        for name, skill_set in iter_employee_rows(parameters):
+            employee_names.append(name)
+            writer.writerow((name, ';'.join(skill_set)))
+    with open(directory / 'shifts.csv', 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(('shift_id', 'start', 'end', 'location', 'required_skills'))
+        writer.writerows((shift_id, start.isoformat(), end.isoformat(), location, skill)
+                         for shift_id, start, end, location, skill in iter_shift_rows(parameters))
+    with open(directory / 'availabilities.csv', 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(('employee', 'date', 'availability_type'))
+        writer.writerows((employee_names[employee], date.isoformat(), availability_type.value)
+                         for employee, date, availability_type in iter_availability_rows(parameters))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Writes a synthetic roster to CSV files')
+    parser.add_argument('directory', type=Path)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--employees', type=int, default=EMPLOYEE_COUNT)
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--wards', type=int, default=len(SHIFT))
+    parser.add_argument('--availability-density', type=float, default=0.1)
+    args = parser.parse_args()
+    write_dataset(DemoDataParameters(seed=args.seed, employee_count=args.employees, day_count=args.days,
+                                     ward_count=args.wards, availability_density=args.availability_density),
+                  args.directory)
@@ -6,7 +6,7 @@ import datetime
 import enum
 
 from pydantic import BaseModel, field_serializer, BeforeValidator, PlainSerializer, \
-    WithJsonSchema
+    WithJsonSchema, Field
 
 
 @optapy.problem_fact
@@ -66,6 +66,30 @@ def shift_pinning_filter(solution, shift):
     return not solution.schedule_state.is_draft(shift)
 
 
+NIGHT_END = datetime.time(6)
+NIGHT_START = datetime.time(20)
+
+
+def get_unsocial_minutes(start: datetime.datetime, end: datetime.datetime) -> int:
+    """The minutes between start and end that fall on a weekend or between NIGHT_START and NIGHT_END."""
+    minutes = 0
+    segment_start = start
+    while segment_start < end:
+        midnight = datetime.datetime.combine(segment_start.date(), datetime.time.min)
+        next_midnight = midnight + datetime.timedelta(days=1)
+        segment_end = min(end, next_midnight)
+        if segment_start.weekday() >= 5:
+            minutes += (segment_end - segment_start).total_seconds() // 60
+        else:
+            for night_start, night_end in ((midnight, datetime.datetime.combine(midnight, NIGHT_END)),
+                                           (datetime.datetime.combine(midnight, NIGHT_START), next_midnight)):
+                overlap = min(segment_end, night_end) - max(segment_start, night_start)
+                if overlap > datetime.timedelta(0):
+                    minutes += overlap.total_seconds() // 60
+        segment_start = segment_end
+    return int(minutes)
+
+
 @optapy.planning_entity(pinning_filter=shift_pinning_filter)
 class Shift:
     shift_id: int
@@ -74,6 +98,7 @@ class Shift:
     location: str
     required_skills: list[str]
     employee: Employee | None
+    unsocial_minutes: int
 
     def __init__(self, shift_id, start: datetime.datetime, end: datetime.datetime,
                  location: str, required_skills: list[str], employee: Employee | None = None):
@@ -83,7 +108,8 @@ class Shift:
         self.location = location
         self.required_skills = required_skills
         self.employee = employee
-
+        # Constant for the shift, so the fairness constraint sums it instead of recalculating it on every move
+        self.unsocial_minutes = get_unsocial_minutes(start, end)
 
     @optapy.planning_id
     def get_id(self):
@@ -108,6 +134,117 @@ class ShiftModel(BaseModel):
     required_skills: list[str]
     employee: EmployeeModel | None
 
+class PublishDeltaModel(BaseModel):
+    publish_id: int
+    first_published_date: datetime.date
+    last_published_date: datetime.date
+    shift_list: list[ShiftModel]
+
+class AssignmentEditModel(BaseModel):
+    shift_id: int
+    employee_name: str | None
+
+class ScenarioShiftModel(BaseModel):
+    start: datetime.datetime
+    end: datetime.datetime
+    location: str
+    required_skills: list[str]
+    employee_name: str | None = None
+
+class ScenarioModel(BaseModel):
+    name: str
+    assignments: list[AssignmentEditModel] = []
+    added_shifts: list[ScenarioShiftModel] = []
+
+class ConstraintDeltaModel(BaseModel):
+    constraint_name: str
+    score_delta: str
+
+class ScenarioResultModel(BaseModel):
+    name: str
+    score: str
+    score_delta: str
+    broken_constraints: list[ConstraintDeltaModel]
+
+DEFAULT_CONSTRAINT_WEIGHTS = {
+    "Missing required skill": optapy.score.HardSoftScore.ONE_HARD,
+    "Overlapping shift": optapy.score.HardSoftScore.ONE_HARD,
+    "At least 10 hours between 2 shifts": optapy.score.HardSoftScore.ONE_HARD,
+    "Max one shift per day": optapy.score.HardSoftScore.ONE_HARD,
+    "Unavailable employee": optapy.score.HardSoftScore.ONE_HARD,
+    "Desired day for employee": optapy.score.HardSoftScore.ONE_SOFT,
+    "Undesired day for employee": optapy.score.HardSoftScore.ONE_SOFT,
+    "Fair distribution of minutes": optapy.score.HardSoftScore.ONE_SOFT,
+    "Fair distribution of night and weekend minutes": optapy.score.HardSoftScore.ONE_SOFT,
+    "Sequential shifts at the same location": optapy.score.HardSoftScore.ZERO,
+    "Sequential shifts at the same slot": optapy.score.HardSoftScore.ZERO,
+}
+
+
+class ScheduleConstraintConfiguration:
+    """
+    The weight of every constraint. A weight of zero turns the constraint off.
+
+    Every distinct set of weights compiles its own constraint provider, which is cached by its signature,
+    so switching back to a configuration that was used before doesn't compile the constraint streams again.
+    """
+    weights: dict[str, optapy.score.HardSoftScore]
+
+    def __init__(self, weights: dict[str, optapy.score.HardSoftScore] | None = None):
+        self.weights = {**DEFAULT_CONSTRAINT_WEIGHTS, **(weights or {})}
+
+    def get_signature(self) -> tuple[tuple[str, int, int], ...]:
+        return tuple((constraint_name, weight.hardScore(), weight.softScore())
+                     for constraint_name, weight in sorted(self.weights.items()))
+
+class ConstraintWeightModel(BaseModel):
+    enabled: bool = True
+    # Left out, the current weight of the constraint (or its default weight, if it is off) is kept
+    hard: int | None = Field(default=None, ge=0)
+    soft: int | None = Field(default=None, ge=0)
+
+class ConstraintConfigurationModel(BaseModel):
+    weights: dict[str, ConstraintWeightModel]
+
+class TerminationReason(enum.Enum):
+    TIME_LIMIT = 'TIME_LIMIT'
+    TERMINATED_EARLY = 'TERMINATED_EARLY'
+    BUDGET_EXCEEDED = 'BUDGET_EXCEEDED'
+    ERROR = 'ERROR'
+
+class RunBudget(BaseModel):
+    max_duration_seconds: float | None = None
+    max_rss_bytes: int | None = None
+    max_jvm_heap_bytes: int | None = None
+
+class ScoreSampleModel(BaseModel):
+    seconds: float
+    score: str
+
+class MemorySampleModel(BaseModel):
+    seconds: float
+    rss_bytes: int
+    jvm_heap_bytes: int | None
+
+class RunRecordModel(BaseModel):
+    problem_id: int
+    shift_count: int
+    employee_count: int
+    started_at: datetime.datetime
+    ended_at: datetime.datetime | None = None
+    duration_seconds: float | None = None
+    termination_reason: TerminationReason | None = None
+    error: str | None = None
+    best_score: str | None = None
+    score_timeline: list[ScoreSampleModel] = []
+    time_to_first_feasible_seconds: float | None = None
+    score_calculation_count: int | None = None
+    memory_samples: list[MemorySampleModel] = []
+    peak_rss_bytes: int = 0
+    peak_jvm_heap_bytes: int | None = None
+    budget: RunBudget | None = None
+    exceeded_budget: list[str] = []
+
 @optapy.planning_solution
 class EmployeeSchedule:
     schedule_state: ScheduleState
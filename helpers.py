@@ -1,5 +1,9 @@
 #!/usr/bin/env python3
 # coding: utf-8
+import os
+import resource
+from collections.abc import Iterator
+from itertools import product
 from random import Random
 
 
@@ -13,13 +17,24 @@ def pick_subset(source: list, random: Random, *distribution: int):
     item_count = random.choices(range(len(distribution)), distribution)
     return random.sample(source, item_count[0])
 
-def join_all_combinations(*part_arrays: list[str]):
+def iter_all_combinations(*part_arrays: list[str]) -> Iterator[str]:
+    """Lazily joins every combination of parts, with the first part varying fastest."""
     if len(part_arrays) == 0:
-        return []
-    if len(part_arrays) == 1:
-        return part_arrays[0]
-    combinations = []
-    for combination in join_all_combinations(*part_arrays[1:]):
-        for item in part_arrays[0]:
-            combinations.append(f'{item} {combination}')
-    return combinations
\ No newline at end of file
+        return
+    for combination in product(*reversed(part_arrays)):
+        yield ' '.join(reversed(combination))
+
+
+def join_all_combinations(*part_arrays: list[str]):
+    return list(iter_all_combinations(*part_arrays))
+
+
+def get_rss_bytes() -> int:
+    """The current resident set size of this process, or the peak one where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if os.uname().sysname == 'Darwin' else max_rss * 1024
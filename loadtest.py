@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Load test for the schedule API.
+
+Drives the app in-process through httpx's ASGI transport, so no server or network is needed.
+For every roster size, concurrent clients send a weighted mix of requests while a solve may be running,
+and latency percentiles, throughput and peak RSS are reported. The checkpoints and run records of the solves
+go to a temporary directory, so the app's own files are left alone.
+
+    $ python loadtest.py --sizes 16x14 200x90 --clients 20 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from random import Random
+
+import httpx
+from optapy.types import SolverStatus
+
+import main
+from archive import ScheduleArchive
+from demo_data import DemoDataParameters, generate_schedule
+from helpers import get_rss_bytes
+
+DEFAULT_MIX = {
+    'GET /schedule': 90,
+    'POST /solve': 4,
+    'POST /publish': 3,
+    'POST /stopSolving': 3,
+}
+
+
+def parse_size(size: str) -> tuple[int, int]:
+    employee_count, day_count = size.lower().split('x')
+    return int(employee_count), int(day_count)
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    out = {}
+    for item in mix.split(','):
+        request, weight = item.split('=')
+        out[request.strip()] = int(weight)
+    return out
+
+
+def get_percentiles(latencies: list[float]) -> dict[str, float | None]:
+    if len(latencies) < 2:
+        latency = latencies[0] if latencies else None
+        return {'p50': latency, 'p95': latency, 'p99': latency}
+    cut_points = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {'p50': cut_points[49], 'p95': cut_points[94], 'p99': cut_points[98]}
+
+
+def load_roster(employee_count: int, day_count: int, seed: int):
+    main.schedule = generate_schedule(DemoDataParameters(seed=seed, employee_count=employee_count,
+                                                         day_count=day_count))
+    # Draft shifts generated on publish must not reuse the ids of the generated roster
+    main.id_gen = main.id_generator(len(main.schedule.shift_list))
+    # Archived shifts belong to the previous roster, so publishing the new one starts from an empty archive
+    main.archive = ScheduleArchive()
+
+
+def redirect_outputs(directory: Path):
+    main.CHECKPOINT_PATH = directory / 'schedule.ckpt'
+    main.checkpoint_writer.path = main.CHECKPOINT_PATH
+    main.run_recorder.path = directory / 'runs.jsonl'
+
+
+def stop_solving():
+    main.stop_solving()
+    while main.get_solver_status() != SolverStatus.NOT_SOLVING:
+        time.sleep(0.1)
+
+
+async def run_client(client: httpx.AsyncClient, requests: list[str], weights: list[int], random: Random,
+                     deadline: float, latencies: dict[str, list[float]], errors: dict[str, int]):
+    while time.perf_counter() < deadline:
+        request = random.choices(requests, weights)[0]
+        method, path = request.split(' ', 1)
+        start = time.perf_counter()
+        response = await client.request(method, path)
+        latencies[request].append(time.perf_counter() - start)
+        if response.is_error:
+            errors[request] += 1
+
+
+async def sample_rss(peak: list[int], interval_seconds: float = 0.05):
+    while True:
+        peak[0] = max(peak[0], get_rss_bytes())
+        await asyncio.sleep(interval_seconds)
+
+
+async def run_load(client_count: int, duration_seconds: float, mix: dict[str, int], seed: int) -> dict:
+    requests = list(mix.keys())
+    weights = list(mix.values())
+    latencies = {request: [] for request in requests}
+    errors = {request: 0 for request in requests}
+    peak_rss = [get_rss_bytes()]
+    transport = httpx.ASGITransport(app=main.api, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url='http://loadtest') as client:
+        sampler = asyncio.create_task(sample_rss(peak_rss))
+        start = time.perf_counter()
+        deadline = start + duration_seconds
+        await asyncio.gather(*(run_client(client, requests, weights, Random(seed + i), deadline, latencies, errors)
+                               for i in range(client_count)))
+        elapsed = time.perf_counter() - start
+        sampler.cancel()
+    return {
+        'elapsed_seconds': elapsed,
+        'request_count': sum(len(request_latencies) for request_latencies in latencies.values()),
+        'throughput': sum(len(request_latencies) for request_latencies in latencies.values()) / elapsed,
+        'peak_rss_bytes': peak_rss[0],
+        'requests': {request: {'count': len(latencies[request]), 'errors': errors[request],
+                               **get_percentiles(latencies[request])}
+                     for request in requests},
+    }
+
+
+def run(sizes: list[tuple[int, int]], client_count: int, duration_seconds: float, mix: dict[str, int],
+        seed: int, output_directory: Path) -> list[dict]:
+    redirect_outputs(output_directory)
+    out = []
+    for employee_count, day_count in sizes:
+        stop_solving()
+        load_roster(employee_count, day_count, seed)
+        # Peak memory is RSS sampled from outside the requests; tracing allocations would slow every request down
+        result = asyncio.run(run_load(client_count, duration_seconds, mix, seed))
+        stop_solving()
+        out.append({'employee_count': employee_count, 'day_count': day_count,
+                    'shift_count': len(main.schedule.shift_list), **result})
+    return out
+
+
+def print_report(results: list[dict]):
+    def milliseconds(seconds: float | None) -> str:
+        return f'{seconds * 1000:9.1f}' if seconds is not None else f'{"-":>9}'
+
+    for result in results:
+        print(f'{result["employee_count"]} employees x {result["day_count"]} days ({result["shift_count"]} shifts): '
+              f'{result["request_count"]} requests, {result["throughput"]:.1f} requests/s, '
+              f'peak RSS {result["peak_rss_bytes"] / 2 ** 20:.1f} MiB')
+        print(f'    {"request":<20}{"count":>7}{"errors":>7}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+        for request, statistic in result['requests'].items():
+            print(f'    {request:<20}{statistic["count"]:>7}{statistic["errors"]:>7} '
+                  f'{milliseconds(statistic["p50"])} {milliseconds(statistic["p95"])} '
+                  f'{milliseconds(statistic["p99"])}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load tests the schedule API in-process')
+    parser.add_argument('--sizes', nargs='+', default=['16x14', '100x28', '200x90'],
+                        help='roster sizes as EMPLOYEESxDAYS')
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30, help='seconds per roster size')
+    parser.add_argument('--mix', default=','.join(f'{request}={weight}' for request, weight in DEFAULT_MIX.items()),
+                        help='weighted requests, for example "GET /schedule=90,POST /solve=10"')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(prefix='loadtest-') as temporary_directory:
+        load_results = run([parse_size(size) for size in args.sizes], args.clients, args.duration,
+                           parse_mix(args.mix), args.seed, Path(temporary_directory))
+    print_report(load_results)
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(load_results, json_file, indent=2)
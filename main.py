@@ -1,24 +1,33 @@
 from collections.abc import Iterator
 
 import datetime
+import os
+from pathlib import Path
 from random import Random
 
-from optapy import solver_manager_create, score_manager_create
-import optapy.config
-from optapy.types import Duration, SolverStatus
+from optapy.types import SolverStatus
 from optapy.score import HardSoftScore
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
-from constraints import employee_scheduling_constraints
-from domain import Employee, Shift, Availability, AvailabilityType, ScheduleState, EmployeeSchedule, \
-    EmployeeScheduleModel
+from archive import ScheduleArchive
+from checkpoint import CheckpointWriter, read_checkpoint, apply_checkpoint
+from domain import Shift, Availability, AvailabilityType, EmployeeSchedule, \
+    EmployeeScheduleModel, ShiftModel, AvailabilityModel, PublishDeltaModel, ScenarioModel, ScenarioResultModel, \
+    ScheduleConstraintConfiguration, ConstraintConfigurationModel, ConstraintWeightModel, DEFAULT_CONSTRAINT_WEIGHTS, \
+    RunBudget, RunRecordModel
 
-from helpers import join_all_combinations, pick_subset, pick_random
+from demo_data import SHIFT_TEMPLATES, DemoDataParameters, generate_schedule
+from helpers import pick_subset, pick_random
+from run_records import RunRecorder
+from scenarios import evaluate_scenarios
+from solvers import get_solver_manager, get_score_manager, get_score_director_factory, SPENT_LIMIT_SECONDS
+from templates import load_templates
 
 api = FastAPI(title="Schedule API", version="1.0", description="API for scheduling")
-api.mount("/static", StaticFiles(directory="typescript-frontend/dist"), name="static")
+# The frontend may not be built, for example when the tests import the API
+api.mount("/static", StaticFiles(directory="typescript-frontend/dist", check_dir=False), name="static")
 api.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -27,199 +36,70 @@ api.add_middleware(
     allow_headers=["*"],
 )
 
-def next_weekday(d, weekday):
-    days_ahead = weekday - d.weekday()
-    if days_ahead <= 0:  # Target day already happened this week
-        days_ahead += 7
-    return d + datetime.timedelta(days_ahead)
-
-
-FIRST_NAMES = ["Amy", "Beth", "Chad", "Dan", "Elsa", "Flo", "Gus", "Hugo", "Ivy", "Jay", "Kate", "Lisa", "Mary", "Nina",
-               "Olivia", "Pat"]
-LAST_NAMES = ["Cole", "Fox", "Green", "Jones", "King", "Li", "Poe", "Rye", "Smith", "Watt", "Xavier", "Yang", "Zhang", "Müller", "Schmidt", "Schneider"]
-
-LOCATION_SHIFT_EMPLOYEE_COUNT = {
-    "Notaufnahme": 1,
-    "Normalstation": 5,
-    "Intensivstation": 1,
-    "Visitendienst": 1,
-}
-
-REQUIRED_SKILLS = list(LOCATION_SHIFT_EMPLOYEE_COUNT.keys())
-OPTIONAL_SKILLS = []
-EMPLOYEE_COUNT = 16
-
-SHIFT = {
-    "Notaufnahme": [
-        [
-            (datetime.time(hour=8), datetime.timedelta(hours=8, minutes=45)),
-            (datetime.time(hour=12), datetime.timedelta(hours=9)),
-            (datetime.time(hour=19, minute=45), datetime.timedelta(hours=12, minutes=45)),
-        ],
-        [
-            (datetime.time(hour=8), datetime.timedelta(hours=8, minutes=45)),
-            (datetime.time(hour=12), datetime.timedelta(hours=9)),
-            (datetime.time(hour=19, minute=45), datetime.timedelta(hours=12, minutes=45)),
-        ],
-        [
-            (datetime.time(hour=8), datetime.timedelta(hours=8, minutes=45)),
-            (datetime.time(hour=12), datetime.timedelta(hours=9)),
-            (datetime.time(hour=19, minute=45), datetime.timedelta(hours=12, minutes=45)),
-        ],
-        [
-            (datetime.time(hour=8), datetime.timedelta(hours=8, minutes=45)),
-            (datetime.time(hour=12), datetime.timedelta(hours=9)),
-            (datetime.time(hour=19, minute=45), datetime.timedelta(hours=12, minutes=45)),
-        ],
-        [
-            (datetime.time(hour=8), datetime.timedelta(hours=12, minutes=30)),
-            (datetime.time(hour=20), datetime.timedelta(hours=12, minutes=30)),
-        ],
-        [
-            (datetime.time(hour=8), datetime.timedelta(hours=12, minutes=30)),
-            (datetime.time(hour=20), datetime.timedelta(hours=12, minutes=30)),
-        ],
-        [
-            (datetime.time(hour=8), datetime.timedelta(hours=12, minutes=30)),
-            (datetime.time(hour=20), datetime.timedelta(hours=12, minutes=30)),
-        ]
-    ],
-    "Normalstation": [
-        [
-            (datetime.time(hour=8), datetime.timedelta(hours=8, minutes=30)),
-        ],
-        [
-            (datetime.time(hour=8), datetime.timedelta(hours=8, minutes=30)),
-        ],
-        [
-            (datetime.time(hour=8), datetime.timedelta(hours=8, minutes=30)),
-        ],
-        [
-            (datetime.time(hour=8), datetime.timedelta(hours=8, minutes=30)),
-        ],
-        [
-            (datetime.time(hour=8), datetime.timedelta(hours=8, minutes=30)),
-        ],
-        [],
-        []
-    ],
-    "Visitendienst": [
-        [],
-        [],
-        [],
-        [],
-        [],
-        [
-            (datetime.time(hour=10), datetime.timedelta(hours=6)),
-        ],
-        [
-            (datetime.time(hour=10), datetime.timedelta(hours=6)),
-        ]
-    ],
-    "Intensivstation": [
-        [
-            (datetime.time(hour=7, minute=30), datetime.timedelta(hours=12, minutes=45)),
-        ],
-        [
-            (datetime.time(hour=7, minute=30), datetime.timedelta(hours=9)),
-        ],
-        [
-            (datetime.time(hour=19, minute=30), datetime.timedelta(hours=12, minutes=45)),
-        ]
-    ]
-}
-
 def id_generator(start=0) -> Iterator[int]:
     """A generator to produce an incremental sequence of IDs starting from `start`."""
     current = start
     while True:
         yield current
         current += 1
-id_gen = id_generator()
+
+# The shift templates can be loaded from a JSON file (see `templates.load_templates`) instead of the demo ones
+shift_templates = load_templates(Path(os.environ['SHIFT_TEMPLATES'])) if 'SHIFT_TEMPLATES' in os.environ \
+    else SHIFT_TEMPLATES
 
 
 def generate_demo_data() -> EmployeeSchedule:
-    initial_roster_length_in_days = 14
-    start_date = next_weekday(datetime.date.today(), 0)  # next Monday
+    return generate_schedule(DemoDataParameters(), shift_templates)
 
-    schedule_state = ScheduleState(publish_length=7, draft_length=initial_roster_length_in_days, first_draft_date=start_date, last_historic_date=start_date)
-    random = Random(0)
-    name_permutations = join_all_combinations(FIRST_NAMES, LAST_NAMES)
-    random.shuffle(name_permutations)
-
-    employee_list = []
-    for i in range(EMPLOYEE_COUNT):
-        skills = pick_subset(OPTIONAL_SKILLS, random, 1, 3)
-        skills.append(pick_random(REQUIRED_SKILLS, random))
-        employee = Employee(name=name_permutations[i], skill_set=skills)
-        employee_list.append(employee)
-
-    shift_list = []
-    availability_list = []
-    for i in range(initial_roster_length_in_days):
-        employees_with_availabilities_on_day = pick_subset(employee_list, random, 4, 3, 2, 1)
-        date = start_date + datetime.timedelta(days=i)
-        for employee in employees_with_availabilities_on_day:
-            availability_type = pick_random(list(AvailabilityType), random)
-            availability = Availability(employee=employee, date=date, availability_type=availability_type)
-            availability_list.append(availability)
-        shift_list.extend(generate_shifts_for_day(date, random))
-    return EmployeeSchedule(
-        schedule_state=schedule_state,
-        availability_list=availability_list,
-        employee_list=employee_list,
-        shift_list=shift_list,
-        solver_status=None,
-        score=None,
-    )
-
-def generate_shifts_for_day(date: datetime.date, random: Random):
-    out = []
-    for location, shift_times_list in SHIFT.items():
-        if len(shift_times_list) == 7:
-            shift_times = shift_times_list[date.weekday()]
-        else:
-            shift_times = pick_random(shift_times_list, random)
-        for shift_start_time, shift_duration in shift_times:
-            shift_start_date_time = datetime.datetime.combine(date, shift_start_time)
-            shift_end_date_time = shift_start_date_time + shift_duration
-            out.extend(list(generate_shift_for_timeslot(shift_start_date_time, shift_end_date_time, location, LOCATION_SHIFT_EMPLOYEE_COUNT[location])))
-    return out
-
-
-def generate_shift_for_timeslot(timeslot_start: datetime.datetime, timeslot_end: datetime.datetime,
-                                location: str, times: int = 1):
-    for i in range(times):
-        shift = Shift(shift_id=next(id_gen), start=timeslot_start, end=timeslot_end, location=location, required_skills=[location], employee=None)
-        yield shift
+
+def generate_shifts(start_date: datetime.date, day_count: int, random: Random) -> list[Shift]:
+    return [Shift(shift_id=next(id_gen), start=start, end=end, location=location, required_skills=[skill],
+                  employee=None)
+            for start, end, location, skill, headcount in shift_templates.expand(start_date, day_count, random)
+            for _ in range(headcount)]
 
 
 def generate_draft_shifts():
     random = Random(0)
+    first_date = schedule.schedule_state.first_draft_date + datetime.timedelta(days=schedule.schedule_state.publish_length)
     for i in range(schedule.schedule_state.publish_length):
         employees_with_availabilities_on_day = pick_subset(schedule.employee_list, random, 4, 3, 2, 1)
-        date = schedule.schedule_state.first_draft_date + datetime.timedelta(days=(schedule.schedule_state.publish_length + i))
+        date = first_date + datetime.timedelta(days=i)
         for employee in employees_with_availabilities_on_day:
             availability_type = pick_random(list(AvailabilityType), random)
             availability = Availability(employee=employee, date=date, availability_type=availability_type)
             schedule.availability_list.append(availability)
-        schedule.shift_list.extend(generate_shifts_for_day(date, random))
+    schedule.shift_list.extend(generate_shifts(first_date, schedule.schedule_state.publish_length, random))
 
 
 
 SINGLETON_ID = 1
-solver_config = optapy.config.solver.SolverConfig()
-solver_config\
-    .withSolutionClass(EmployeeSchedule)\
-    .withEntityClasses(Shift)\
-    .withConstraintProviderClass(employee_scheduling_constraints)\
-    .withTerminationSpentLimit(Duration.ofSeconds(60))
-
-solver_manager = solver_manager_create(solver_config)
-score_manager = score_manager_create(solver_manager)
+constraint_configuration = ScheduleConstraintConfiguration()
+solver_manager = get_solver_manager(constraint_configuration)
+active_solver_manager = solver_manager
+score_manager = get_score_manager(constraint_configuration)
 last_score = HardSoftScore.ZERO
 
 schedule: EmployeeSchedule = generate_demo_data()
+# Draft shifts generated on publish must not reuse the ids of the generated roster
+id_gen = id_generator(len(schedule.shift_list))
+archive = ScheduleArchive()
+
+# The constraints never look further back than the previous day (10 hours between shifts, one shift per day),
+# so on publish everything that ended before that is moved to the archive.
+LIVE_HISTORY = datetime.timedelta(days=1)
+
+CHECKPOINT_PATH = Path('checkpoints/schedule.ckpt')
+checkpoint_writer = CheckpointWriter(CHECKPOINT_PATH)
+
+# Budgets per roster size, keyed by the smallest shift count they apply to. A solve exceeding its budget is
+# terminated early and recorded as such. The durations stay below the solver's spent limit, otherwise they could
+# never be exceeded: small rosters should settle in half of it, large ones get all but the last few seconds.
+RUN_BUDGETS = {
+    0: RunBudget(max_duration_seconds=SPENT_LIMIT_SECONDS // 2, max_rss_bytes=2 * 1024 ** 3),
+    5_000: RunBudget(max_duration_seconds=SPENT_LIMIT_SECONDS - 5, max_rss_bytes=4 * 1024 ** 3),
+}
+run_recorder = RunRecorder(Path('runs/runs.jsonl'), RUN_BUDGETS)
 
 @api.get('/schedule', response_model=EmployeeScheduleModel, tags=['Schedule'])
 def get_schedule():
@@ -229,17 +109,82 @@ def get_schedule():
 
 
 def get_solver_status() -> SolverStatus:
-    return solver_manager.getSolverStatus(SINGLETON_ID)
+    return active_solver_manager.getSolverStatus(SINGLETON_ID)
 
 
 def error_handler(problem_id, exception):
     print(f'an exception occurred solving {problem_id}: {exception.getMessage()}')
     exception.printStackTrace()
+    run_recorder.on_error(exception.getMessage())
+
+
+@api.get('/constraintConfiguration', response_model=ConstraintConfigurationModel, tags=['Schedule'])
+def get_constraint_configuration():
+    return ConstraintConfigurationModel(weights={
+        constraint_name: ConstraintWeightModel(enabled=not weight.isZero(), hard=weight.hardScore(),
+                                               soft=weight.softScore())
+        for constraint_name, weight in constraint_configuration.weights.items()
+    })
+
+
+def apply_constraint_weights(base: ScheduleConstraintConfiguration,
+                             constraint_configuration_model: ConstraintConfigurationModel) \
+        -> ScheduleConstraintConfiguration:
+    """Returns `base` with the weights of `constraint_configuration_model` applied, leaving `base` unchanged."""
+    weights = dict(base.weights)
+    for constraint_name, weight in constraint_configuration_model.weights.items():
+        if constraint_name not in DEFAULT_CONSTRAINT_WEIGHTS:
+            raise HTTPException(status_code=422, detail=f'There is no constraint with name ({constraint_name})')
+        if not weight.enabled:
+            weights[constraint_name] = HardSoftScore.ZERO
+            continue
+        current_weight = weights[constraint_name]
+        if current_weight.isZero():
+            current_weight = DEFAULT_CONSTRAINT_WEIGHTS[constraint_name]
+        hard = weight.hard if weight.hard is not None else current_weight.hardScore()
+        soft = weight.soft if weight.soft is not None else current_weight.softScore()
+        if hard == 0 and soft == 0:
+            raise HTTPException(status_code=422, detail=f'The enabled constraint ({constraint_name}) needs a hard '
+                                                        f'or soft weight above zero')
+        weights[constraint_name] = HardSoftScore.of(hard, soft)
+    return ScheduleConstraintConfiguration(weights)
+
+
+@api.put('/constraintConfiguration', tags=['Schedule'])
+def update_constraint_configuration(constraint_configuration_model: ConstraintConfigurationModel):
+    global constraint_configuration, solver_manager, score_manager
+    if get_solver_status() != SolverStatus.NOT_SOLVING:
+        raise RuntimeError('Cannot change the constraint configuration while solving in progress.')
+    constraint_configuration = apply_constraint_weights(constraint_configuration, constraint_configuration_model)
+    # Compiles the constraint streams of a configuration that wasn't used before
+    solver_manager = get_solver_manager(constraint_configuration)
+    score_manager = get_score_manager(constraint_configuration)
 
 
 @api.post('/solve', tags=['Schedule'])
-def solve():
-    solver_manager.solveAndListen(SINGLETON_ID, find_by_id, save, error_handler)
+def solve(resume: bool = False, constraint_configuration_model: ConstraintConfigurationModel | None = None):
+    global active_solver_manager
+    if get_solver_status() != SolverStatus.NOT_SOLVING:
+        raise RuntimeError('Cannot start solving while solving in progress.')
+    # Weights in the body only apply to this solve, the deployment's configuration stays as it is
+    solve_configuration = apply_constraint_weights(constraint_configuration, constraint_configuration_model) \
+        if constraint_configuration_model is not None else constraint_configuration
+    active_solver_manager = get_solver_manager(solve_configuration)
+    if resume:
+        if not CHECKPOINT_PATH.exists():
+            raise ValueError(f'There is no checkpoint to resume from ({CHECKPOINT_PATH})')
+        # Local search needs every shift assigned, otherwise the construction heuristic has to run first
+        if apply_checkpoint(schedule, read_checkpoint(CHECKPOINT_PATH)):
+            active_solver_manager = get_solver_manager(solve_configuration, local_search_only=True)
+    run_recorder.start(SINGLETON_ID, schedule)
+    # The fourth positional parameter is the final best solution consumer, so the handler is passed by keyword
+    solver_job = active_solver_manager.solveAndListen(SINGLETON_ID, find_by_id, save, exception_handler=error_handler)
+    run_recorder.watch(active_solver_manager, solver_job)
+
+
+@api.get('/runs', response_model=list[RunRecordModel], tags=['Schedule'])
+def get_runs(limit: int = 100, min_shift_count: int = 0, max_shift_count: int | None = None):
+    return run_recorder.read(limit, min_shift_count, max_shift_count)
 
 @api.post('/publish', tags=['Schedule'])
 def publish():
@@ -252,11 +197,45 @@ def publish():
     schedule_state.last_historic_date = new_historic_date
     schedule_state.first_draft_date = new_draft_date
 
+    new_historic_date_time = datetime.datetime.combine(new_historic_date, datetime.time.min)
+    new_draft_date_time = datetime.datetime.combine(new_draft_date, datetime.time.min)
+    archive.record_publish((shift for shift in schedule.shift_list
+                            if new_historic_date_time <= shift.start < new_draft_date_time),
+                           new_historic_date, new_draft_date - datetime.timedelta(days=1))
+    archive.compact(schedule, new_historic_date_time - LIVE_HISTORY)
+
     generate_draft_shifts()
 
+
+@api.get('/publish/deltas', response_model=list[PublishDeltaModel], tags=['Schedule'])
+def get_publish_deltas(since: int = 0):
+    return archive.deltas_since(since)
+
+
+@api.get('/archive/shifts', response_model=list[ShiftModel], tags=['Archive'])
+def get_archived_shifts(start: datetime.datetime, end: datetime.datetime):
+    return archive.shifts_between(start, end)
+
+
+@api.get('/archive/availabilities', response_model=list[AvailabilityModel], tags=['Archive'])
+def get_archived_availabilities(start: datetime.date, end: datetime.date):
+    return archive.availabilities_between(start, end)
+
+
+@api.get('/archive/minutes', response_model=dict[str, int], tags=['Archive'])
+def get_archived_minutes_by_employee(start: datetime.datetime, end: datetime.datetime):
+    return archive.minutes_by_employee(start, end)
+
+@api.post('/scenarios', response_model=list[ScenarioResultModel], tags=['Schedule'])
+def evaluate(scenarios: list[ScenarioModel]):
+    if get_solver_status() != SolverStatus.NOT_SOLVING:
+        raise RuntimeError('Cannot evaluate scenarios while solving in progress.')
+    return evaluate_scenarios(get_score_director_factory(constraint_configuration), schedule, scenarios)
+
 @api.post('/stopSolving', tags=['Schedule'])
 def stop_solving():
-    solver_manager.terminateEarly(SINGLETON_ID)
+    run_recorder.on_terminate_early()
+    active_solver_manager.terminateEarly(SINGLETON_ID)
 
 def find_by_id(schedule_id):
     if schedule_id != SINGLETON_ID:
@@ -267,3 +246,5 @@ def find_by_id(schedule_id):
 def save(solution):
     global schedule
     schedule = solution
+    checkpoint_writer.submit(solution)
+    run_recorder.on_best_solution(solution)
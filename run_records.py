@@ -0,0 +1,173 @@
+import datetime
+import math
+import threading
+import time
+from pathlib import Path
+
+from optapy.types import SolverStatus
+
+from domain import EmployeeSchedule, TerminationReason, RunBudget, ScoreSampleModel, MemorySampleModel, \
+    RunRecordModel
+from helpers import get_rss_bytes
+
+
+def get_jvm_heap_bytes() -> int | None:
+    try:
+        import jpype
+        runtime = jpype.JClass('java.lang.Runtime').getRuntime()
+        return int(runtime.totalMemory() - runtime.freeMemory())
+    except Exception:
+        return None
+
+
+def find_score_calculation_count_gauge(problem_id: int):
+    """Finds the score calculation count gauge the solver manager registers in Micrometer while a problem is solving."""
+    try:
+        import jpype
+        metrics = jpype.JClass('io.micrometer.core.instrument.Metrics')
+        return metrics.globalRegistry.find('optaplanner.solver.score.calculation.count') \
+            .tag('problem.id', str(problem_id)).gauge()
+    except Exception:
+        return None
+
+
+def read_gauge(gauge) -> int | None:
+    value = gauge.value()
+    return int(value) if not math.isnan(value) else None
+
+
+def get_budget(budgets: dict[int, RunBudget], shift_count: int) -> RunBudget | None:
+    """Returns the budget of the largest roster size in `budgets` that `shift_count` reaches."""
+    reached_sizes = [size for size in budgets if size <= shift_count]
+    return budgets[max(reached_sizes)] if reached_sizes else None
+
+
+class RunRecorder:
+    """
+    Records one structured run record per solve and appends it to a JSON lines file.
+
+    The best solution callback only feeds the score timeline, so it stays cheap for the solver thread.
+    A background thread samples memory and the score calculation count until the solver stops. That thread also
+    enforces the budget of the roster size by terminating the solve early.
+    """
+
+    def __init__(self, path: Path, budgets: dict[int, RunBudget] | None = None, sample_interval_seconds: float = 1):
+        self.path = path
+        self.budgets = budgets or {}
+        self.sample_interval_seconds = sample_interval_seconds
+        self._lock = threading.Lock()
+        self._record: RunRecordModel | None = None
+        self._start: float = 0
+
+    def start(self, problem_id: int, schedule: EmployeeSchedule):
+        """Opens the record of a solve; called before solving so no best solution event is missed."""
+        with self._lock:
+            self._start = time.perf_counter()
+            self._record = RunRecordModel(problem_id=problem_id, shift_count=len(schedule.shift_list),
+                                          employee_count=len(schedule.employee_list),
+                                          started_at=datetime.datetime.now(datetime.timezone.utc),
+                                          budget=get_budget(self.budgets, len(schedule.shift_list)))
+
+    def watch(self, solver_manager, solver_job):
+        """Samples the opened record until `solver_manager` stops solving it, then writes it."""
+        with self._lock:
+            record = self._record
+            start = self._start
+        threading.Thread(target=self._sample_until_solved, args=(solver_manager, solver_job, record, start),
+                         name='run-recorder', daemon=True).start()
+
+    def on_best_solution(self, solution: EmployeeSchedule):
+        with self._lock:
+            if self._record is None:
+                return
+            score = solution.get_score()
+            seconds = time.perf_counter() - self._start
+            self._record.score_timeline.append(ScoreSampleModel(seconds=seconds, score=score.toString()))
+            self._record.best_score = score.toString()
+            if self._record.time_to_first_feasible_seconds is None and score.isFeasible():
+                self._record.time_to_first_feasible_seconds = seconds
+
+    def on_error(self, message: str):
+        with self._lock:
+            # OptaPy reports a failed solve twice, the first message is the root cause
+            if self._record is not None and self._record.termination_reason != TerminationReason.ERROR:
+                self._record.termination_reason = TerminationReason.ERROR
+                self._record.error = message
+
+    def on_terminate_early(self):
+        with self._lock:
+            if self._record is not None and self._record.termination_reason is None:
+                self._record.termination_reason = TerminationReason.TERMINATED_EARLY
+
+    @staticmethod
+    def _sample(record: RunRecordModel, seconds: float, score_calculation_count: int | None):
+        sample = MemorySampleModel(seconds=seconds, rss_bytes=get_rss_bytes(),
+                                   jvm_heap_bytes=get_jvm_heap_bytes())
+        record.memory_samples.append(sample)
+        record.peak_rss_bytes = max(record.peak_rss_bytes, sample.rss_bytes)
+        if sample.jvm_heap_bytes is not None:
+            record.peak_jvm_heap_bytes = max(record.peak_jvm_heap_bytes or 0, sample.jvm_heap_bytes)
+        if score_calculation_count is not None:
+            record.score_calculation_count = score_calculation_count
+
+    @staticmethod
+    def _exceeded_budget(record: RunRecordModel, seconds: float) -> list[str]:
+        budget = record.budget
+        if budget is None:
+            return []
+        out = []
+        if budget.max_duration_seconds is not None and seconds > budget.max_duration_seconds:
+            out.append('max_duration_seconds')
+        if budget.max_rss_bytes is not None and record.peak_rss_bytes > budget.max_rss_bytes:
+            out.append('max_rss_bytes')
+        if budget.max_jvm_heap_bytes is not None and (record.peak_jvm_heap_bytes or 0) > budget.max_jvm_heap_bytes:
+            out.append('max_jvm_heap_bytes')
+        return out
+
+    def _sample_until_solved(self, solver_manager, solver_job, record: RunRecordModel, start: float):
+        gauge = None
+        while solver_manager.getSolverStatus(record.problem_id) != SolverStatus.NOT_SOLVING:
+            if gauge is None:
+                gauge = find_score_calculation_count_gauge(record.problem_id)
+            score_calculation_count = read_gauge(gauge) if gauge is not None else None
+            with self._lock:
+                seconds = time.perf_counter() - start
+                self._sample(record, seconds, score_calculation_count)
+                exceeded_budget = self._exceeded_budget(record, seconds)
+                terminate = exceeded_budget and record.termination_reason is None
+                if terminate:
+                    record.termination_reason = TerminationReason.BUDGET_EXCEEDED
+                    record.exceeded_budget = exceeded_budget
+            # Outside the lock, since terminating may wait for the best solution callback
+            if terminate:
+                solver_manager.terminateEarly(record.problem_id)
+            time.sleep(self.sample_interval_seconds)
+        # The gauge is unregistered once the solve ends, but still reads the count of the solver, which
+        # `solver_job` keeps alive, so this reading includes the last interval
+        final_score_calculation_count = read_gauge(gauge) if gauge is not None else None
+        with self._lock:
+            if final_score_calculation_count is not None:
+                record.score_calculation_count = final_score_calculation_count
+            record.ended_at = datetime.datetime.now(datetime.timezone.utc)
+            record.duration_seconds = time.perf_counter() - start
+            if record.termination_reason is None:
+                record.termination_reason = TerminationReason.TIME_LIMIT
+            if self._record is record:
+                self._record = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a') as file:
+            file.write(record.model_dump_json() + '\n')
+
+    def read(self, limit: int = 100, min_shift_count: int = 0,
+             max_shift_count: int | None = None) -> list[RunRecordModel]:
+        """Returns the last `limit` run records of the rosters with a shift count in the given range."""
+        if not self.path.exists():
+            return []
+        out = []
+        with open(self.path) as file:
+            for line in file:
+                record = RunRecordModel.model_validate_json(line)
+                if record.shift_count >= min_shift_count and \
+                        (max_shift_count is None or record.shift_count <= max_shift_count):
+                    out.append(record)
+        return out[-limit:] if limit > 0 else []
@@ -0,0 +1,104 @@
+from copy import copy
+from itertools import count
+
+from optapy import get_class
+from optapy.score import HardSoftScore
+
+from domain import Shift, EmployeeSchedule, ScenarioModel, ScenarioResultModel, ConstraintDeltaModel
+
+EMPLOYEE_VARIABLE = 'employee'
+
+
+def set_working_schedule(score_director, schedule: EmployeeSchedule) -> dict[int, object]:
+    """Sets `schedule` as the working solution of `score_director` and returns its working shifts by shift id."""
+    from org.optaplanner.optapy import PythonSolver  # noqa
+    score_director.setWorkingSolution(PythonSolver.wrapProblem(get_class(EmployeeSchedule), schedule))
+    working_shift_list = []
+    score_director.getSolutionDescriptor().visitAllEntities(score_director.getWorkingSolution(),
+                                                            working_shift_list.append)
+    return {working_shift.get__optapy_Id().shift_id: working_shift for working_shift in working_shift_list}
+
+
+def get_constraint_scores(score_director):
+    """Returns the score of every constraint that matched the working solution of `score_director`."""
+    return {constraint_match_total.getConstraintName(): constraint_match_total.getScore()
+            for constraint_match_total in score_director.getConstraintMatchTotalMap().values()}
+
+
+def evaluate_scenarios(score_director_factory, schedule: EmployeeSchedule,
+                       scenarios: list[ScenarioModel]) -> list[ScenarioResultModel]:
+    """
+    Scores every scenario against `schedule`.
+
+    One score director works on a copy of the schedule's shifts, so `schedule` is never changed and requests that
+    read or solve it never see a scenario's edits. The copy is scored once; every scenario then applies its edits
+    to it, is scored incrementally and is undone again. Added shifts are in the copy from the start, but stay
+    unassigned (so no constraint matches them) except in their own scenario.
+    """
+    employee_by_name = {employee.name: employee for employee in schedule.employee_list}
+
+    def find_employee(employee_name: str | None):
+        if employee_name is None:
+            return None
+        if employee_name not in employee_by_name:
+            raise ValueError(f'There is no employee with name ({employee_name})')
+        return employee_by_name[employee_name]
+
+    # Copies the shifts, so a concurrent publish replacing or extending the list doesn't change the base
+    # and the scenarios' edits never reach the live shifts
+    shift_list = [copy(shift) for shift in schedule.shift_list]
+    shift_ids = {shift.shift_id for shift in shift_list}
+    # Negative ids can't collide with the ids of the real shifts
+    added_shift_ids = count(-1, -1)
+    # Every scenario's edits as (shift id, employee), validated before anything is scored
+    scenario_edits = []
+    for scenario in scenarios:
+        edits = []
+        for assignment in scenario.assignments:
+            if assignment.shift_id not in shift_ids:
+                raise ValueError(f'There is no shift with id ({assignment.shift_id})')
+            edits.append((assignment.shift_id, find_employee(assignment.employee_name)))
+        for added_shift in scenario.added_shifts:
+            shift_list.append(Shift(shift_id=next(added_shift_ids), start=added_shift.start, end=added_shift.end,
+                                    location=added_shift.location, required_skills=added_shift.required_skills))
+            edits.append((shift_list[-1].shift_id, find_employee(added_shift.employee_name)))
+        scenario_edits.append(edits)
+    shift_by_id = {shift.shift_id: shift for shift in shift_list}
+
+    score_director = score_director_factory.buildScoreDirector(False, True)
+    try:
+        working_shifts = set_working_schedule(score_director, EmployeeSchedule(
+            schedule.schedule_state, list(schedule.availability_list), schedule.employee_list, shift_list))
+
+        def set_employee(shift_id: int, employee):
+            # The working shift wraps the copied shift, which the score director reads the new employee from
+            score_director.beforeVariableChanged(working_shifts[shift_id], EMPLOYEE_VARIABLE)
+            shift_by_id[shift_id].set_employee(employee)
+            score_director.afterVariableChanged(working_shifts[shift_id], EMPLOYEE_VARIABLE)
+
+        base_score = score_director.calculateScore()
+        base_constraint_scores = get_constraint_scores(score_director)
+        out = []
+        for scenario, edits in zip(scenarios, scenario_edits):
+            undo_edits = []
+            for shift_id, employee in edits:
+                undo_edits.append((shift_id, shift_by_id[shift_id].employee))
+                set_employee(shift_id, employee)
+            score = score_director.calculateScore()
+            constraint_scores = get_constraint_scores(score_director)
+            for shift_id, employee in reversed(undo_edits):
+                set_employee(shift_id, employee)
+
+            broken_constraints = []
+            for constraint_name, constraint_score in constraint_scores.items():
+                score_delta = constraint_score.subtract(base_constraint_scores.get(constraint_name,
+                                                                                  HardSoftScore.ZERO))
+                if score_delta.compareTo(HardSoftScore.ZERO) < 0:
+                    broken_constraints.append(ConstraintDeltaModel(constraint_name=constraint_name,
+                                                                   score_delta=score_delta.toString()))
+            out.append(ScenarioResultModel(name=scenario.name, score=score.toString(),
+                                           score_delta=score.subtract(base_score).toString(),
+                                           broken_constraints=broken_constraints))
+        return out
+    finally:
+        score_director.close()
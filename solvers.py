@@ -0,0 +1,80 @@
+from optapy import solver_manager_create, score_manager_create, solver_factory_create
+import optapy.config
+from optapy.types import Duration
+
+from constraints import build_constraint_provider
+from domain import EmployeeSchedule, Shift, ScheduleConstraintConfiguration
+
+# The termination of every solve; run budgets are derived from it, see `main.RUN_BUDGETS`
+SPENT_LIMIT_SECONDS = 60
+
+_constraint_providers = {}
+_solver_managers = {}
+_score_managers = {}
+_score_director_factories = {}
+
+
+def get_constraint_provider(constraint_configuration: ScheduleConstraintConfiguration | None = None):
+    """
+    Returns the constraint provider of a constraint configuration, building it on first use.
+
+    The weights are compiled into the constraint streams, so providers are cached per weight signature.
+    """
+    constraint_configuration = constraint_configuration or ScheduleConstraintConfiguration()
+    signature = constraint_configuration.get_signature()
+    if signature not in _constraint_providers:
+        _constraint_providers[signature] = build_constraint_provider(constraint_configuration.weights)
+    return _constraint_providers[signature]
+
+
+def build_solver_config(constraint_configuration: ScheduleConstraintConfiguration | None = None,
+                        local_search_only: bool = False, spent_limit_seconds: int = SPENT_LIMIT_SECONDS):
+    solver_config = optapy.config.solver.SolverConfig()
+    solver_config\
+        .withSolutionClass(EmployeeSchedule)\
+        .withEntityClasses(Shift)\
+        .withConstraintProviderClass(get_constraint_provider(constraint_configuration))\
+        .withTerminationSpentLimit(Duration.ofSeconds(spent_limit_seconds))
+    if local_search_only:
+        # Continues local search on already assigned shifts instead of running the construction heuristic first
+        solver_config.withPhases(optapy.config.localsearch.LocalSearchPhaseConfig())
+    return solver_config
+
+
+def get_solver_manager(constraint_configuration: ScheduleConstraintConfiguration | None = None,
+                       local_search_only: bool = False, spent_limit_seconds: int = SPENT_LIMIT_SECONDS):
+    """
+    Returns the solver manager of a constraint configuration, building it on first use.
+
+    Building a solver manager compiles the constraint streams, so it is cached per signature: the constraint
+    weights, the phases and the termination. Switching back to a configuration reuses its compiled solver manager.
+    """
+    constraint_configuration = constraint_configuration or ScheduleConstraintConfiguration()
+    signature = (constraint_configuration.get_signature(), local_search_only, spent_limit_seconds)
+    if signature not in _solver_managers:
+        _solver_managers[signature] = solver_manager_create(
+            build_solver_config(constraint_configuration, local_search_only, spent_limit_seconds))
+    return _solver_managers[signature]
+
+
+def get_score_manager(constraint_configuration: ScheduleConstraintConfiguration | None = None):
+    """Returns the score manager of a constraint configuration, sharing the cached solver manager."""
+    constraint_configuration = constraint_configuration or ScheduleConstraintConfiguration()
+    signature = constraint_configuration.get_signature()
+    if signature not in _score_managers:
+        _score_managers[signature] = score_manager_create(get_solver_manager(constraint_configuration))
+    return _score_managers[signature]
+
+
+def get_score_director_factory(constraint_configuration: ScheduleConstraintConfiguration | None = None):
+    """
+    Returns the score director factory of a constraint configuration, building it on first use.
+
+    Score directors built by it score edits to a working solution incrementally, see `scenarios.evaluate_scenarios`.
+    """
+    constraint_configuration = constraint_configuration or ScheduleConstraintConfiguration()
+    signature = constraint_configuration.get_signature()
+    if signature not in _score_director_factories:
+        _score_director_factories[signature] = solver_factory_create(
+            build_solver_config(constraint_configuration)).getScoreDirectorFactory()
+    return _score_director_factories[signature]
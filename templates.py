@@ -0,0 +1,197 @@
+import datetime
+import json
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from random import Random
+
+WEEKLY = 'weekly'
+ROTATING = 'rotating'
+RANDOM = 'random'
+KINDS = (WEEKLY, ROTATING, RANDOM)
+SUNDAY = 6
+
+# A compiled row: (offset from midnight, duration, location, required skill, headcount)
+TemplateRow = tuple[datetime.timedelta, datetime.timedelta, str, str, int]
+
+
+def time_to_offset(time: datetime.time) -> datetime.timedelta:
+    return datetime.timedelta(hours=time.hour, minutes=time.minute, seconds=time.second)
+
+
+def parse_hours_minutes(value: str) -> datetime.timedelta:
+    hours, minutes = value.split(':')
+    return datetime.timedelta(hours=int(hours), minutes=int(minutes))
+
+
+class WardTemplate:
+    """
+    The shift pattern of one ward.
+
+    `day_patterns` holds lists of (start time, duration). How a date picks its pattern depends on `kind`:
+    `weekly` uses the pattern of its weekday, `rotating` cycles through the patterns day by day starting at
+    `anchor` and `random` draws one pattern per day. On holidays `holiday_pattern` is used instead, if given.
+    Without one, a weekly ward is staffed like on a Sunday, while a rotating or random ward, which has no
+    weekdays, keeps its rotation or draw.
+    The ward only has shifts between `valid_from` and `valid_until` and, with `interval_weeks` > 1,
+    only every `interval_weeks` weeks counted from `anchor`.
+    """
+
+    def __init__(self, location: str, skill: str, headcount: int, kind: str,
+                 day_patterns: list[list[tuple[datetime.time, datetime.timedelta]]],
+                 holiday_pattern: list[tuple[datetime.time, datetime.timedelta]] | None = None,
+                 interval_weeks: int = 1, anchor: datetime.date = datetime.date(2000, 1, 3),
+                 valid_from: datetime.date | None = None, valid_until: datetime.date | None = None):
+        if kind not in KINDS:
+            raise ValueError(f'The template kind ({kind}) of location ({location}) is not one of {KINDS}')
+        if kind == WEEKLY and len(day_patterns) != 7:
+            raise ValueError(f'The weekly template of location ({location}) needs 7 day patterns, '
+                             f'not ({len(day_patterns)})')
+        if not day_patterns:
+            raise ValueError(f'The template of location ({location}) needs at least one day pattern')
+        if interval_weeks < 1:
+            raise ValueError(f'The interval in weeks ({interval_weeks}) of location ({location}) must be at least 1')
+        if headcount < 1:
+            raise ValueError(f'The headcount ({headcount}) of location ({location}) must be at least 1')
+        if valid_from is not None and valid_until is not None and valid_from > valid_until:
+            raise ValueError(f'The template of location ({location}) is valid from ({valid_from}), '
+                             f'which is after ({valid_until})')
+        self.location = location
+        self.skill = skill
+        self.headcount = headcount
+        self.kind = kind
+        self.day_patterns = day_patterns
+        self.holiday_pattern = holiday_pattern
+        self.interval_weeks = interval_weeks
+        self.anchor = anchor
+        self.valid_from = valid_from
+        self.valid_until = valid_until
+        self.rows = [self._compile(pattern) for pattern in day_patterns]
+        self.holiday_rows = self._compile(holiday_pattern) if holiday_pattern is not None else None
+
+    def _compile(self, pattern: list[tuple[datetime.time, datetime.timedelta]]) -> list[TemplateRow]:
+        return [(time_to_offset(start_time), duration, self.location, self.skill, self.headcount)
+                for start_time, duration in pattern]
+
+    def with_location(self, location: str) -> 'WardTemplate':
+        return WardTemplate(location, self.skill, self.headcount, self.kind, self.day_patterns,
+                            self.holiday_pattern, self.interval_weeks, self.anchor, self.valid_from,
+                            self.valid_until)
+
+    def is_plain_weekly(self) -> bool:
+        return self.kind == WEEKLY and self.interval_weeks == 1 and self.valid_from is None \
+            and self.valid_until is None
+
+    def is_recurring_on(self, date: datetime.date) -> bool:
+        if self.valid_from is not None and date < self.valid_from:
+            return False
+        if self.valid_until is not None and date > self.valid_until:
+            return False
+        return self.interval_weeks == 1 or ((date - self.anchor).days // 7) % self.interval_weeks == 0
+
+
+class ShiftTemplateSet:
+    """
+    The compiled shift templates of all wards, together with the holidays they observe.
+
+    On holidays every ward uses its holiday pattern; weekly wards without one use their Sunday pattern and the
+    other wards without one their usual pattern of the day.
+    """
+
+    def __init__(self, wards: list[WardTemplate], holidays: Iterable[datetime.date] = ()):
+        self.wards = wards
+        self.holidays = frozenset(holidays)
+        # Plain weekly wards are merged into one table per weekday (and one for holidays),
+        # so only the other wards need any work per day
+        plain_weekly_wards = [ward for ward in wards if ward.is_plain_weekly()]
+        self.other_wards = [ward for ward in wards if not ward.is_plain_weekly()]
+        self.weekday_rows: list[list[TemplateRow]] = [
+            [row for ward in plain_weekly_wards for row in ward.rows[weekday]] for weekday in range(7)
+        ]
+        self.holiday_rows: list[TemplateRow] = [
+            row for ward in plain_weekly_wards
+            for row in (ward.holiday_rows if ward.holiday_rows is not None else ward.rows[SUNDAY])
+        ]
+
+    def get_rows_per_day(self, start_date: datetime.date, day_count: int,
+                         random: Random) -> list[list[TemplateRow]]:
+        """Resolves the template rows of every day of the range, drawing the random patterns all at once."""
+        dates = [start_date + datetime.timedelta(days=day) for day in range(day_count)]
+        rows_per_day = [list(self.holiday_rows if date in self.holidays else self.weekday_rows[date.weekday()])
+                        for date in dates]
+        for ward in self.other_wards:
+            picks = random.choices(range(len(ward.rows)), k=day_count) if ward.kind == RANDOM else None
+            for day, date in enumerate(dates):
+                if not ward.is_recurring_on(date):
+                    continue
+                is_holiday = date in self.holidays
+                if is_holiday and ward.holiday_rows is not None:
+                    rows_per_day[day].extend(ward.holiday_rows)
+                elif ward.kind == WEEKLY:
+                    rows_per_day[day].extend(ward.rows[SUNDAY if is_holiday else date.weekday()])
+                elif ward.kind == ROTATING:
+                    rows_per_day[day].extend(ward.rows[(date - ward.anchor).days % len(ward.rows)])
+                else:
+                    rows_per_day[day].extend(ward.rows[picks[day]])
+        return rows_per_day
+
+    def expand(self, start_date: datetime.date, day_count: int,
+               random: Random) -> Iterator[tuple[datetime.datetime, datetime.datetime, str, str, int]]:
+        """Yields (start, end, location, required skill, headcount) for every shift slot in the date range."""
+        midnight = datetime.datetime.combine(start_date, datetime.time.min)
+        one_day = datetime.timedelta(days=1)
+        for rows in self.get_rows_per_day(start_date, day_count, random):
+            for offset, duration, location, skill, headcount in rows:
+                start = midnight + offset
+                yield start, start + duration, location, skill, headcount
+            midnight += one_day
+
+
+def compile_templates(shift: dict[str, list[list[tuple[datetime.time, datetime.timedelta]]]],
+                      headcounts: dict[str, int], holidays: Iterable[datetime.date] = ()) -> ShiftTemplateSet:
+    """Compiles a `SHIFT`-style dictionary: locations with 7 day patterns are weekly, the others random."""
+    return ShiftTemplateSet([WardTemplate(location, location, headcounts[location],
+                                          WEEKLY if len(day_patterns) == 7 else RANDOM, day_patterns)
+                             for location, day_patterns in shift.items()], holidays)
+
+
+def load_templates(path: Path) -> ShiftTemplateSet:
+    """
+    Loads shift templates from a JSON file like
+
+        {
+            "holidays": ["2024-12-25"],
+            "wards": [{
+                "location": "Notaufnahme", "skill": "Notaufnahme", "headcount": 1, "kind": "rotating",
+                "days": [[["08:00", "08:45"], ["19:45", "12:45"]], []],
+                "holiday": [["08:00", "12:30"]],
+                "interval_weeks": 1, "anchor": "2024-01-01", "valid_from": null, "valid_until": null
+            }]
+        }
+
+    where every shift is a start time and a duration, both as HH:MM.
+    """
+    with open(path) as file:
+        config = json.load(file)
+
+    def parse_pattern(pattern: list[list[str]]) -> list[tuple[datetime.time, datetime.timedelta]]:
+        return [(datetime.time.fromisoformat(start_time), parse_hours_minutes(duration))
+                for start_time, duration in pattern]
+
+    def parse_date(value: str | None) -> datetime.date | None:
+        return datetime.date.fromisoformat(value) if value is not None else None
+
+    wards = []
+    for ward in config['wards']:
+        wards.append(WardTemplate(
+            location=ward['location'],
+            skill=ward.get('skill', ward['location']),
+            headcount=ward.get('headcount', 1),
+            kind=ward.get('kind', WEEKLY),
+            day_patterns=[parse_pattern(pattern) for pattern in ward['days']],
+            holiday_pattern=parse_pattern(ward['holiday']) if ward.get('holiday') is not None else None,
+            interval_weeks=ward.get('interval_weeks', 1),
+            anchor=parse_date(ward.get('anchor')) or datetime.date(2000, 1, 3),
+            valid_from=parse_date(ward.get('valid_from')),
+            valid_until=parse_date(ward.get('valid_until')),
+        ))
+    return ShiftTemplateSet(wards, [datetime.date.fromisoformat(holiday) for holiday in config.get('holidays', [])])
@@ -1,9 +1,26 @@
-from domain import AvailabilityType, Availability, Employee, Shift, EmployeeSchedule
+from archive import ScheduleArchive
+from templates import WardTemplate, ShiftTemplateSet, WEEKLY, ROTATING, RANDOM
+from checkpoint import write_checkpoint, read_checkpoint, apply_checkpoint
+from demo_data import DemoDataParameters, generate_schedule
+import scenarios
+from scenarios import evaluate_scenarios
+from run_records import RunRecorder, get_budget
+from domain import AvailabilityType, Availability, Employee, Shift, EmployeeSchedule, ScheduleState, \
+    ScheduleConstraintConfiguration, ScenarioModel, AssignmentEditModel, ScenarioShiftModel, RunBudget, RunRecordModel, \
+    TerminationReason
 from constraints import employee_scheduling_constraints, required_skill, no_overlapping_shifts, \
-    at_least_10_hours_between_two_shifts, desired_day_for_employee, undesired_day_for_employee, unavailable_employee
+    at_least_10_hours_between_two_shifts, desired_day_for_employee, undesired_day_for_employee, unavailable_employee, \
+    fair_distribution_of_minutes, fair_distribution_of_unsocial_minutes
 
+from solvers import get_constraint_provider
+
+from optapy.score import HardSoftScore
 from optapy.test import ConstraintVerifier, constraint_verifier_build
 from datetime import date, time, datetime, timedelta
+from random import Random
+from types import SimpleNamespace
+from time import monotonic, sleep
+import pytest
 
 DAY_1 = date(2021, 2, 1)
 DAY_2 = date(2021, 2, 2)
@@ -211,3 +228,364 @@ def test_undesired_day_for_employee():
                unavailability,
                Shift(1, DAY_START_TIME, DAY_END_TIME, "Location", ["Skill"], employee1)) \
         .penalizes(0)
+
+
+def test_fair_distribution_of_minutes():
+    employee1 = Employee("Amy", ["Skill"])
+    employee2 = Employee("Beth", ["Skill"])
+    constraint_verifier.verify_that(fair_distribution_of_minutes) \
+        .given(employee1, employee2,
+               Shift(1, DAY_START_TIME, DAY_END_TIME, "Location", ["Skill"], employee1),
+               Shift(2, DAY_START_TIME + timedelta(days=1), DAY_END_TIME + timedelta(days=1), "Location", ["Skill"],
+                     employee1)) \
+        .penalizes_by(16 * 16)
+
+    constraint_verifier.verify_that(fair_distribution_of_minutes) \
+        .given(employee1, employee2,
+               Shift(1, DAY_START_TIME, DAY_END_TIME, "Location", ["Skill"], employee1),
+               Shift(2, DAY_START_TIME + timedelta(days=1), DAY_END_TIME + timedelta(days=1), "Location", ["Skill"],
+                     employee2)) \
+        .penalizes_by(8 * 8 + 8 * 8)
+
+
+def test_fair_distribution_of_unsocial_minutes():
+    employee1 = Employee("Amy", ["Skill"])
+    employee2 = Employee("Beth", ["Skill"])
+    night_start = datetime.combine(DAY_1, time(20, 0))
+    weekend_start = datetime.combine(date(2021, 2, 6), time(10, 0))
+    constraint_verifier.verify_that(fair_distribution_of_unsocial_minutes) \
+        .given(employee1, employee2,
+               Shift(1, DAY_START_TIME, DAY_END_TIME, "Location", ["Skill"], employee1),
+               Shift(2, night_start, night_start + timedelta(hours=12), "Location", ["Skill"], employee1),
+               Shift(3, weekend_start, weekend_start + timedelta(hours=6), "Location", ["Skill"], employee2)) \
+        .penalizes_by(10 * 10 + 6 * 6)
+
+
+def test_shift_unsocial_minutes():
+    friday_night = datetime.combine(date(2021, 2, 5), time(20, 0))
+    # 4 night hours on Friday and 8 weekend hours on Saturday, split at midnight
+    assert Shift(1, friday_night, friday_night + timedelta(hours=12), "Location", ["Skill"]).unsocial_minutes == 720
+    assert Shift(2, DAY_START_TIME, DAY_END_TIME, "Location", ["Skill"]).unsocial_minutes == 0
+
+
+def test_constraint_configuration():
+    constraint_configuration = ScheduleConstraintConfiguration({
+        "Missing required skill": HardSoftScore.of(3, 0),
+        "Overlapping shift": HardSoftScore.of(0, 2),
+        "Fair distribution of minutes": HardSoftScore.ZERO,
+        "Fair distribution of night and weekend minutes": HardSoftScore.ZERO,
+    })
+    configured_constraint_verifier = constraint_verifier_build(get_constraint_provider(constraint_configuration),
+                                                               EmployeeSchedule, Shift)
+    employee = Employee("Amy", [])
+    # Both shifts miss the skill (2 * 3 hard), overlap for 4 hours (240 * 2 soft) and are on the same day (1 hard)
+    configured_constraint_verifier.verify_that() \
+        .given(employee,
+               Shift(1, DAY_START_TIME, DAY_END_TIME, "Location", ["Skill"], employee),
+               Shift(2, AFTERNOON_START_TIME, AFTERNOON_END_TIME, "Location 2", ["Skill"], employee)) \
+        .scores(HardSoftScore.of(-7, -480))
+    assert get_constraint_provider(ScheduleConstraintConfiguration(constraint_configuration.weights)) \
+        is get_constraint_provider(constraint_configuration)
+
+
+def test_archive_compaction():
+    employee = Employee("Amy", ["Skill"])
+    historic_shift = Shift(1, DAY_START_TIME, DAY_END_TIME, "Location", ["Skill"], employee)
+    live_shift = Shift(2, DAY_START_TIME + timedelta(days=2), DAY_END_TIME + timedelta(days=2), "Location", ["Skill"])
+    schedule = EmployeeSchedule(ScheduleState(publish_length=7, draft_length=14, first_draft_date=DAY_3,
+                                              last_historic_date=DAY_3),
+                                [Availability(employee, DAY_1, AvailabilityType.DESIRED),
+                                 Availability(employee, DAY_3, AvailabilityType.UNDESIRED)],
+                                [employee], [historic_shift, live_shift])
+    archive = ScheduleArchive()
+    delta = archive.record_publish(schedule.shift_list, DAY_1, DAY_2)
+    archive.compact(schedule, datetime.combine(DAY_2, time.min))
+
+    assert schedule.shift_list == [live_shift]
+    assert [availability.date for availability in schedule.availability_list] == [DAY_3]
+    assert archive.shifts_between(datetime.combine(DAY_1, time.min), datetime.combine(DAY_2, time.min)) == [{
+        'shift_id': 1,
+        'start': DAY_START_TIME,
+        'end': DAY_END_TIME,
+        'location': "Location",
+        'required_skills': ["Skill"],
+        'employee': {'name': "Amy", 'skill_set': ["Skill"]},
+    }]
+    assert archive.availabilities_between(DAY_1, DAY_3)[0]['availability_type'] == AvailabilityType.DESIRED
+    assert archive.minutes_by_employee(datetime.combine(DAY_1, time.min), datetime.combine(DAY_3, time.min)) == \
+           {"Amy": 8 * 60}
+    assert delta.publish_id == 1
+    assert [shift['shift_id'] for shift in archive.deltas_since(0)[0]['shift_list']] == [1, 2]
+    assert archive.deltas_since(1) == []
+
+
+def test_archive_compaction_keeps_shifts_sorted():
+    employee = Employee("Amy", ["Skill"])
+    long_shift = Shift(1, datetime(2024, 1, 1, 8), datetime(2024, 1, 3), "Location", ["Skill"], employee)
+    short_shift = Shift(2, datetime(2024, 1, 2, 10), datetime(2024, 1, 2, 12), "Location", ["Skill"], employee)
+    schedule = EmployeeSchedule(ScheduleState(publish_length=7, draft_length=14, first_draft_date=date(2024, 1, 8),
+                                              last_historic_date=date(2024, 1, 7)),
+                                [], [employee], [long_shift, short_shift])
+    archive = ScheduleArchive()
+    archive.compact(schedule, datetime(2024, 1, 2, 23))
+    # The long shift starts before the archived short shift, but ends after the first cutoff
+    archive.compact(schedule, datetime(2024, 1, 5))
+
+    assert schedule.shift_list == []
+    assert [shift['shift_id'] for shift in archive.shifts_between(datetime(2024, 1, 1), datetime(2024, 1, 2))] == [1]
+    assert [shift['shift_id'] for shift in archive.shifts_between(datetime(2024, 1, 2), datetime(2024, 1, 3))] == [2]
+    assert [shift['shift_id'] for shift in archive.shifts_between(datetime(2024, 1, 1), datetime(2024, 1, 5))] == \
+           [1, 2]
+
+
+class FakeScoreDirector:
+    """Scores the working schedule with one soft point per assigned shift and one hard point per shift of Beth."""
+
+    def __init__(self):
+        self.working_schedule = None
+        self.calculation_count = 0
+        self.changing_shift = None
+        self.closed = False
+
+    def set_working_schedule(self, schedule: EmployeeSchedule):
+        assert self.working_schedule is None, "The working solution is set only once"
+        self.working_schedule = schedule
+        return {shift.shift_id: shift for shift in schedule.shift_list}
+
+    def beforeVariableChanged(self, shift: Shift, variable_name: str):
+        assert self.changing_shift is None and variable_name == "employee"
+        self.changing_shift = shift
+
+    def afterVariableChanged(self, shift: Shift, variable_name: str):
+        assert self.changing_shift is shift and variable_name == "employee"
+        self.changing_shift = None
+
+    def calculateScore(self):
+        self.calculation_count += 1
+        return HardSoftScore.of(sum(score.hardScore() for score in self.get_constraint_scores().values()),
+                                sum(score.softScore() for score in self.get_constraint_scores().values()))
+
+    def get_constraint_scores(self):
+        assigned_shifts = [shift for shift in self.working_schedule.shift_list if shift.employee is not None]
+        return {
+            "Shift of Beth": HardSoftScore.of(-sum(shift.employee.name == "Beth" for shift in assigned_shifts), 0),
+            "Shift count": HardSoftScore.of(0, -len(assigned_shifts)),
+        }
+
+    def getConstraintMatchTotalMap(self):
+        return {name: SimpleNamespace(getConstraintName=lambda name=name: name, getScore=lambda score=score: score)
+                for name, score in self.get_constraint_scores().items()}
+
+    def close(self):
+        self.closed = True
+
+
+def test_evaluate_scenarios(monkeypatch):
+    monkeypatch.setattr(scenarios, 'set_working_schedule',
+                        lambda score_director, schedule: score_director.set_working_schedule(schedule))
+    employee1 = Employee("Amy", ["Skill"])
+    employee2 = Employee("Beth", ["Skill"])
+    shift = Shift(1, DAY_START_TIME, DAY_END_TIME, "Location", ["Skill"], employee1)
+    schedule = EmployeeSchedule(ScheduleState(publish_length=7, draft_length=14, first_draft_date=DAY_1,
+                                              last_historic_date=DAY_1 - timedelta(days=7)),
+                                [], [employee1, employee2], [shift])
+    score_director = FakeScoreDirector()
+    score_director_factory = SimpleNamespace(buildScoreDirector=lambda look_up_enabled, constraint_match_enabled:
+                                             score_director)
+    results = evaluate_scenarios(score_director_factory, schedule, [
+        ScenarioModel(name="Unassign", assignments=[AssignmentEditModel(shift_id=1, employee_name=None)]),
+        ScenarioModel(name="Swap", assignments=[AssignmentEditModel(shift_id=1, employee_name="Beth")]),
+        ScenarioModel(name="Add", added_shifts=[ScenarioShiftModel(start=AFTERNOON_START_TIME,
+                                                                   end=AFTERNOON_END_TIME, location="Location",
+                                                                   required_skills=["Skill"],
+                                                                   employee_name="Amy")]),
+    ])
+
+    assert [(result.name, result.score_delta) for result in results] == \
+           [("Unassign", "0hard/1soft"), ("Swap", "-1hard/0soft"), ("Add", "0hard/-1soft")]
+    assert [[(constraint.constraint_name, constraint.score_delta) for constraint in result.broken_constraints]
+            for result in results] == [[], [("Shift of Beth", "-1hard/0soft")], [("Shift count", "0hard/-1soft")]]
+    # One working solution is scored once, then once per scenario, and every scenario's edits are undone
+    assert score_director.calculation_count == 1 + 3 and score_director.closed
+    assert [(working_shift.shift_id, working_shift.employee)
+            for working_shift in score_director.working_schedule.shift_list] == [(1, employee1), (-1, None)]
+    # The scenarios are scored on copies, the schedule itself is left untouched
+    assert schedule.shift_list == [shift] and shift.employee is employee1
+    assert score_director.working_schedule.shift_list[0] is not shift
+
+    with pytest.raises(ValueError):
+        evaluate_scenarios(score_director_factory, schedule,
+                           [ScenarioModel(name="Unknown", assignments=[AssignmentEditModel(shift_id=1,
+                                                                                           employee_name="Carl")])])
+    assert schedule.shift_list == [shift] and shift.employee is employee1
+
+
+def test_generate_schedule_is_deterministic():
+    parameters = DemoDataParameters(seed=1, employee_count=300, day_count=28, ward_count=9, start_date=DAY_1)
+    schedule = generate_schedule(parameters)
+    other_schedule = generate_schedule(parameters)
+
+    assert len({employee.name for employee in schedule.employee_list}) == 300
+    # The names are spread over the last names instead of running through the first names of one
+    demo_names = [employee.name for employee in generate_schedule(DemoDataParameters()).employee_list]
+    assert len({name.split(' ')[1] for name in demo_names}) >= 8
+    assert len({name.split(' ')[0] for name in demo_names}) >= 8
+    assert len({shift.shift_id for shift in schedule.shift_list}) == len(schedule.shift_list)
+    assert len(schedule.availability_list) == 28 * 30
+    assert [(shift.start, shift.location) for shift in schedule.shift_list] == \
+           [(shift.start, shift.location) for shift in other_schedule.shift_list]
+    assert [(availability.employee.name, availability.availability_type)
+            for availability in schedule.availability_list] == \
+           [(availability.employee.name, availability.availability_type)
+            for availability in other_schedule.availability_list]
+
+
+def test_checkpoint_round_trip(tmp_path):
+    parameters = DemoDataParameters(employee_count=20, day_count=7, start_date=DAY_1)
+    schedule = generate_schedule(parameters)
+    for i, shift in enumerate(schedule.shift_list[1:]):
+        shift.employee = schedule.employee_list[i % len(schedule.employee_list)]
+    write_checkpoint(tmp_path / 'schedule.ckpt', schedule)
+
+    checkpoint = read_checkpoint(tmp_path / 'schedule.ckpt')
+    restored_schedule = generate_schedule(parameters)
+    assert not apply_checkpoint(restored_schedule, checkpoint)
+    assert [shift.employee.name if shift.employee is not None else None for shift in restored_schedule.shift_list] == \
+           [shift.employee.name if shift.employee is not None else None for shift in schedule.shift_list]
+
+    schedule.shift_list[0].employee = schedule.employee_list[0]
+    write_checkpoint(tmp_path / 'schedule.ckpt', schedule)
+    assert apply_checkpoint(restored_schedule, read_checkpoint(tmp_path / 'schedule.ckpt'))
+
+
+def test_checkpoint_only_restores_matching_draft_shifts(tmp_path):
+    parameters = DemoDataParameters(employee_count=20, day_count=7, start_date=DAY_1)
+    schedule = generate_schedule(parameters)
+    for shift in schedule.shift_list:
+        shift.employee = schedule.employee_list[0]
+    write_checkpoint(tmp_path / 'schedule.ckpt', schedule)
+    checkpoint = read_checkpoint(tmp_path / 'schedule.ckpt')
+
+    # After a restart with another roster, the same ids name other shifts
+    other_schedule = generate_schedule(DemoDataParameters(employee_count=20, day_count=7, start_date=DAY_2))
+    assert not apply_checkpoint(other_schedule, checkpoint)
+    assert all(shift.employee is None for shift in other_schedule.shift_list)
+
+    # Published shifts are pinned and keep their assignment
+    published_schedule = generate_schedule(parameters)
+    published_schedule.schedule_state.first_draft_date = DAY_2
+    apply_checkpoint(published_schedule, checkpoint)
+    assert all((shift.employee is not None) == published_schedule.schedule_state.is_draft(shift)
+               for shift in published_schedule.shift_list)
+
+
+def test_shift_templates():
+    morning = [(time(8, 0), timedelta(hours=8))]
+    night = [(time(20, 0), timedelta(hours=12))]
+    weekly = WardTemplate("Weekly", "Skill", 2, WEEKLY, [morning] * 5 + [[]] * 2, holiday_pattern=night)
+    rotating = WardTemplate("Rotating", "Skill", 1, ROTATING, [morning, night], anchor=DAY_1, interval_weeks=2)
+    templates = ShiftTemplateSet([weekly, rotating], holidays=[DAY_2])
+
+    rows = list(templates.expand(DAY_1, 10, Random(0)))
+    assert rows[:4] == [
+        (datetime.combine(DAY_1, time(8, 0)), datetime.combine(DAY_1, time(16, 0)), "Weekly", "Skill", 2),
+        (datetime.combine(DAY_1, time(8, 0)), datetime.combine(DAY_1, time(16, 0)), "Rotating", "Skill", 1),
+        (datetime.combine(DAY_2, time(20, 0)), datetime.combine(DAY_3, time(8, 0)), "Weekly", "Skill", 2),
+        (datetime.combine(DAY_2, time(20, 0)), datetime.combine(DAY_3, time(8, 0)), "Rotating", "Skill", 1),
+    ]
+    # DAY_1 is a Monday, so the rotating ward has no shifts in the second week and the weekly one none on the weekend
+    assert [start.date() for start, _, location, _, _ in rows if location == "Rotating"] == \
+           [DAY_1 + timedelta(days=day) for day in range(7)]
+    assert [start.date() for start, _, location, _, _ in rows if location == "Weekly"] == \
+           [DAY_1 + timedelta(days=day) for day in (0, 1, 2, 3, 4, 7, 8, 9)]
+
+
+def test_random_shift_template_on_holiday():
+    morning = [(time(8, 0), timedelta(hours=8))]
+    night = [(time(20, 0), timedelta(hours=12))]
+    random_ward = WardTemplate("Random", "Skill", 1, RANDOM, [morning, night])
+    closed_on_holidays = WardTemplate("Random", "Skill", 1, RANDOM, [morning, night], holiday_pattern=[])
+
+    rows = list(ShiftTemplateSet([random_ward]).expand(DAY_1, 7, Random(0)))
+    # Without a holiday pattern the holiday keeps its draw, with one only the holiday changes
+    assert list(ShiftTemplateSet([random_ward], holidays=[DAY_2]).expand(DAY_1, 7, Random(0))) == rows
+    assert list(ShiftTemplateSet([closed_on_holidays], holidays=[DAY_2]).expand(DAY_1, 7, Random(0))) == \
+           [row for row in rows if row[0].date() != DAY_2]
+    assert [start.date() for start, _, _, _, _ in rows] == [DAY_1 + timedelta(days=day) for day in range(7)]
+
+
+
+@pytest.mark.parametrize('kind, changes', [
+    (ROTATING, {'day_patterns': []}),
+    (RANDOM, {'day_patterns': []}),
+    (ROTATING, {'interval_weeks': 0}),
+    (ROTATING, {'headcount': 0}),
+    (ROTATING, {'valid_from': DAY_2, 'valid_until': DAY_1}),
+])
+def test_invalid_shift_template(kind, changes):
+    arguments = {'headcount': 1, 'day_patterns': [[(time(8, 0), timedelta(hours=8))]], **changes}
+    with pytest.raises(ValueError):
+        WardTemplate("Location", "Skill", kind=kind, **arguments)
+
+def test_get_budget():
+    small_budget = RunBudget(max_duration_seconds=60)
+    large_budget = RunBudget(max_duration_seconds=120)
+    budgets = {100: small_budget, 5_000: large_budget}
+    assert get_budget(budgets, 99) is None
+    assert get_budget(budgets, 100) is small_budget
+    assert get_budget(budgets, 4_999) is small_budget
+    assert get_budget(budgets, 10_000) is large_budget
+    assert get_budget({}, 100) is None
+
+
+def test_exceeded_budget():
+    record = RunRecordModel(problem_id=1, shift_count=10, employee_count=2, started_at=datetime(2024, 1, 1),
+                            budget=RunBudget(max_duration_seconds=90, max_rss_bytes=1_000, max_jvm_heap_bytes=1_000))
+    record.peak_rss_bytes = 1_000
+    assert RunRecorder._exceeded_budget(record, 90) == []
+    record.peak_rss_bytes = 1_001
+    assert RunRecorder._exceeded_budget(record, 91) == ['max_duration_seconds', 'max_rss_bytes']
+    # An unknown JVM heap never exceeds its budget
+    assert record.peak_jvm_heap_bytes is None
+    record.peak_jvm_heap_bytes = 1_001
+    assert 'max_jvm_heap_bytes' in RunRecorder._exceeded_budget(record, 0)
+    record.budget = None
+    assert RunRecorder._exceeded_budget(record, 1_000) == []
+
+
+def test_read_run_records(tmp_path):
+    run_recorder = RunRecorder(tmp_path / 'runs.jsonl')
+    assert run_recorder.read() == []
+    with open(run_recorder.path, 'w') as file:
+        for shift_count in (10, 100, 1_000):
+            file.write(RunRecordModel(problem_id=1, shift_count=shift_count, employee_count=2,
+                                      started_at=datetime(2024, 1, 1)).model_dump_json() + '\n')
+
+    def read_shift_counts(**kwargs) -> list[int]:
+        return [record.shift_count for record in run_recorder.read(**kwargs)]
+
+    assert read_shift_counts() == [10, 100, 1_000]
+    assert read_shift_counts(min_shift_count=100) == [100, 1_000]
+    assert read_shift_counts(max_shift_count=100) == [10, 100]
+    assert read_shift_counts(min_shift_count=50, max_shift_count=500) == [100]
+    assert read_shift_counts(limit=2) == [100, 1_000]
+    assert read_shift_counts(limit=0) == []
+
+
+def test_solver_error_reaches_run_recorder(tmp_path, monkeypatch):
+    import main
+
+    def find_by_id(problem_id):
+        raise ValueError(f'There is no schedule with id ({problem_id})')
+
+    run_recorder = RunRecorder(tmp_path / 'runs.jsonl', sample_interval_seconds=0.1)
+    monkeypatch.setattr(main, 'run_recorder', run_recorder)
+    monkeypatch.setattr(main, 'find_by_id', find_by_id)
+    main.solve()
+    deadline = monotonic() + 30
+    while not run_recorder.read() and monotonic() < deadline:
+        sleep(0.1)
+
+    [record] = run_recorder.read()
+    assert record.termination_reason == TerminationReason.ERROR
+    assert record.error